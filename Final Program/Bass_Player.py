@@ -25,6 +25,9 @@ class Bass_Player(Player):
     
     general_preference = 0
     
+    # The bass doesn't search (it follows the chords)
+    candidate_target = 0
+    
     
     
     """ SUPERCLASS FUNCTION IMPLEMENTATIONS """ 
@@ -96,13 +99,22 @@ class Bass_Player(Player):
     
     """
     Converts a pattern to it's equivalent MIDI information
-    (Wait for the chord player to send a melody and import it)
+    (Import the bassline the chord player sent)
     """
     def convert(self, sequence):
         
-        # Wait for chord player input
-        self.bass_output.wait()
-            
-        bassline = self.output.get(self.ID)
+        # Take the bassline the chord player sent for this 16th note
+        bassline = self.bass_output.receive(self.tick)
         
-        return bassline
\ No newline at end of file
+        return bassline
+    
+    
+    
+    """ OVERWRITTEN FUNCTIONS """
+    
+    """
+    Wait for the chord player to send the bassline for this 16th note
+    """
+    def receive(self):
+        while not self.bass_output.ready(self.tick):
+            yield self.bass_output
\ No newline at end of file
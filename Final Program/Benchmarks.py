@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:31:09 2026
+
+@author: beaun
+"""
+
+import threading
+import time
+import random
+import statistics
+
+from Chord_Player import Chord_Player
+from Melody_Player import Melody_Player
+from Drum_Player import Drum_Player
+from Bass_Player import Bass_Player
+from Board import Board, Mailbox
+from Clock import Clock, Virtual_Clock
+from Search_Pool import Search_Pool
+from Metrics import levenshtein_table, bit_levenshtein
+from Combiner import combine, recursive_combine, fill
+from Markov import markov_model
+from Variations import split_rhythm, join_rhythm, shift_rhythm
+import Ensemble
+
+
+
+""" SYNCHRONISATION """
+
+"""
+Measure the synchronisation overhead per 16th note (in seconds) of the shared dictionary,
+where every player writes under a lock and everyone meets at a barrier.
+The first player also acts as the drummer.
+"""
+def barrier_overhead(players, ticks):
+
+    timing = threading.Condition()
+    barrier = threading.Barrier(players)
+    lock = threading.Lock()
+    clock = Virtual_Clock(0.1)
+    output = dict()
+
+    def play(ID):
+        for tick in range(ticks):
+
+            # Drummer releases the 16th note, the others wait for it
+            with timing:
+                if ID == 0:
+                    clock.release(tick)
+                    timing.notify_all()
+                else:
+                    timing.wait_for(lambda: clock.tick >= tick)
+
+            # Write output
+            with lock:
+                output[ID] = [tick, 1]
+
+            # Wait for others to finish writing and read their outputs
+            barrier.wait()
+            heard = [output[other].copy() for other in range(players)]
+
+    return run(play, players, ticks)
+
+
+
+"""
+Measure the synchronisation overhead per 16th note (in seconds) of the double buffered board,
+where every player publishes before the drummer releases the 16th note and reads the front after.
+The first player also acts as the drummer.
+"""
+def board_overhead(players, ticks):
+
+    timing = threading.Condition()
+    board = Board(players)
+    clock = Virtual_Clock(0.1)
+
+    def play(ID):
+        for tick in range(ticks):
+
+            # Publish output
+            board.publish(tick, ID, (tick, 1))
+
+            # Drummer swaps and releases the 16th note, the others wait for it
+            if ID == 0:
+                board.wait(tick)
+                board.swap(tick)
+            with timing:
+                if ID == 0:
+                    clock.release(tick)
+                    timing.notify_all()
+                else:
+                    timing.wait_for(lambda: clock.tick >= tick)
+
+            # Read the outputs
+            output = board.read(tick)
+            heard = [list(output[other]) for other in range(players)]
+
+    return run(play, players, ticks)
+
+
+
+"""
+Run a function in a number of threads and return the time it took per 16th note
+"""
+def run(play, players, ticks):
+
+    threads = [threading.Thread(target = play, args = (ID,)) for ID in range(players)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return (time.perf_counter() - start) / ticks
+
+
+
+""" RUNTIMES """
+
+"""
+Stand-in for a MIDI port that ignores all messages
+"""
+class Silent_Port:
+    def send(self, message):
+        pass
+
+
+
+"""
+Let the band play live (without sound) with either the thread or the asyncio runtime.
+Returns the tick jitter (standard deviation and maximum of the lateness, in seconds)
+and the CPU usage (CPU time divided by wall time).
+"""
+def runtime_usage(runtime, BPM, phrases):
+
+    timing = threading.Condition()
+    board = Board(4)
+    clock = Clock(BPM)
+    guides = (timing, board, clock)
+    port = Silent_Port()
+
+    bass = Bass_Player('A', 'Minor', phrases, BPM, guides, port, channel = 1)
+    chords = Chord_Player('A', 'Minor', phrases, BPM, guides, port, channel = 2)
+    melody = Melody_Player('A', 'Minor', phrases, BPM, guides, port, channel = 3)
+    drums = Drum_Player('A', 'Minor', phrases, BPM, guides, port, channel = 4)
+    players = [bass, chords, melody, drums]
+
+    bass_output = Mailbox()
+    chords.bass_output = bass_output
+    bass.bass_output = bass_output
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    clock.start()
+
+    if runtime == 'asyncio':
+        Ensemble.play(players, clock, board)
+
+    else:
+        for player in players:
+            player.start()
+        for player in players:
+            player.join()
+
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+
+    return statistics.pstdev(clock.lateness), max(clock.lateness), cpu / wall
+
+
+
+""" SEARCH POOL """
+
+"""
+Create a player that can deliberate on its own, outside of a band
+"""
+def lone_player(cls):
+
+    guides = (threading.Condition(), Board(1), Virtual_Clock(100))
+    player = cls('A', 'Minor', 1, 100, guides, Silent_Port(), channel = 1)
+
+    # Give it a sequence to vary on
+    player.short_memory[player.ID] = player.start_sequence()
+
+    return player
+
+
+
+"""
+Return the number of candidates a melody player scores per 16th note,
+searching in its own thread (0 workers) or in a pool of worker processes
+"""
+def pool_throughput(workers, ticks, deliberation_time):
+
+    player = lone_player(Melody_Player)
+    if workers > 0:
+        player.pool = Search_Pool(player, workers)
+
+    for tick in range(ticks):
+        player.tick = tick
+        player.deliberate(deliberation_time)
+
+    if workers > 0:
+        player.pool.close()
+
+    return player.considered / ticks
+
+
+
+"""
+Return the candidates a melody player ends up with after a number of 16th notes,
+searching with a fixed seed and candidate budget
+"""
+def pool_candidates(workers, ticks, budget):
+
+    random.seed(0)
+    player = lone_player(Melody_Player)
+    player.candidate_budget = budget
+    player.pool = Search_Pool(player, workers)
+    player.pool.seed = 0
+
+    for tick in range(ticks):
+        player.tick = tick
+        player.deliberate(0)
+
+    player.pool.close()
+
+    return player.candidates.items()
+
+
+
+""" LEVENSHTEIN """
+
+"""
+Return the time per call (in seconds) of the table and the bit-parallel levenshtein distance
+on random rhythm grids of a given length, after checking that they agree
+"""
+def levenshtein_speed(length, pairs):
+    
+    grids = [([random.randint(0, 1) for _ in range(length)], [random.randint(0, 1) for _ in range(length)]) for _ in range(pairs)]
+    
+    for s1, s2 in grids:
+        assert levenshtein_table(s1, s2) == bit_levenshtein(s1, s2)
+        
+    times = list()
+    for distance in [levenshtein_table, bit_levenshtein]:
+        start = time.perf_counter()
+        for s1, s2 in grids:
+            distance(s1, s2)
+        times.append((time.perf_counter() - start) / pairs)
+        
+    return times
+    
+    
+    
+""" BATCH SCORING """
+
+"""
+Return the time per candidate (in seconds) of scoring a block of candidates one by one
+and all at once, after checking that both give the same scores
+"""
+def batch_speed(cls, block, blocks):
+    
+    player = lone_player(cls)
+    player.cooperation = True
+    sequence = player.short_memory.get(player.ID)
+    memory = player.short_memory
+    candidates = [[player.vary(sequence) for _ in range(block)] for _ in range(blocks)]
+    
+    for sequences in candidates:
+        assert player.score_batch(memory, sequences) == [player.score(memory, sequence) for sequence in sequences]
+    
+    start = time.perf_counter()
+    for sequences in candidates:
+        [player.score(memory, sequence) for sequence in sequences]
+    single = (time.perf_counter() - start) / (block * blocks)
+    
+    start = time.perf_counter()
+    for sequences in candidates:
+        player.score_batch(memory, sequences)
+    batch = (time.perf_counter() - start) / (block * blocks)
+    
+    return single, batch
+    
+    
+    
+""" COMBINER """
+
+"""
+Return the time per call (in seconds) of the recursive combine, the iterative combine (with an empty memo)
+and the memoized combine, on the progressions & rhythms of the chord player and variations of the rhythms,
+after checking that they agree
+"""
+def combine_speed(pairs):
+    
+    player = lone_player(Chord_Player)
+    progressions, rhythms = player.lengths.get('progressions'), player.lengths.get('rhythms')
+    
+    combinations = list()
+    for _ in range(pairs):
+        rhythm = random.choice([split_rhythm, join_rhythm, shift_rhythm])(rhythms.at_least(progressions.minimum))
+        combinations.append((progressions.at_most(len(rhythm)), rhythm))
+    
+    for progression, rhythm in combinations:
+        assert combine(progression, rhythm) == recursive_combine(progression, rhythm)
+    
+    times = list()
+    for memo in [None, False, True]:
+        fill.cache_clear()
+        if memo:
+            for progression, rhythm in combinations:
+                combine(progression, rhythm)
+        combiner = recursive_combine if memo is None else combine
+        start = time.perf_counter()
+        for progression, rhythm in combinations:
+            combiner(progression, rhythm)
+        times.append((time.perf_counter() - start) / pairs)
+    
+    return times
+    
+    
+    
+""" MARKOV """
+
+"""
+Return the time per call (in seconds) of drawing a rhythm and a progression from the libraries (by length)
+and from n-gram models (the corpus models if they were extracted, models of the player's libraries otherwise)
+"""
+def sampler_speed(cls, draws):
+    
+    player = lone_player(cls)
+    progressions, rhythms = player.lengths.get('progressions'), player.lengths.get('rhythms')
+    models = {key: markov_model(path, player.libraries.get(key)) for key, path in cls.models.items()}
+    
+    samplers = [lambda: rhythms.at_least(3), lambda: progressions.sample(1, 4),
+                lambda: models.get('rhythms').rhythm(3), lambda: models.get('progressions').progression(1, 4)]
+    
+    times = list()
+    for sampler in samplers:
+        start = time.perf_counter()
+        for _ in range(draws):
+            sampler()
+        times.append((time.perf_counter() - start) / draws)
+    
+    return times
+    
+    
+    
+""" BENCHMARKS """
+
+# Number of 16th notes to measure each benchmark over
+ticks = 2000
+
+print("\nSynchronisation overhead per 16th note")
+print("Players\tBarrier\t\tBoard")
+for players in [2, 4, 8, 16]:
+    barrier = barrier_overhead(players, ticks)
+    board = board_overhead(players, ticks)
+    print("{:d}\t{:.1f} us\t{:.1f} us".format(players, barrier * 1e6, board * 1e6))
+
+print("\nTick jitter and CPU usage per runtime")
+print("Runtime\tJitter\t\tMax lateness\tCPU")
+for runtime in ['threads', 'asyncio']:
+    jitter, lateness, usage = runtime_usage(runtime, 300, 1)
+    print("{:s}\t{:.3f} ms\t{:.3f} ms\t{:.0f}%".format(runtime, jitter * 1000, lateness * 1000, usage * 100))
+
+print("\nCandidates scored per 16th note (37.5 ms of deliberation)")
+print("Workers\tCandidates")
+for workers in [0, 1, 2, 4, 8]:
+    print("{:d}\t{:.1f}".format(workers, pool_throughput(workers, 50, 0.0375)))
+
+print("\nScoring time per candidate (blocks of 64)")
+print("Player\tOne by one\tBatch")
+for cls in [Chord_Player, Melody_Player, Drum_Player]:
+    single, batch = batch_speed(cls, 64, 25)
+    print("{:s}\t{:.1f} us\t\t{:.1f} us".format(cls.ID, single * 1e6, batch * 1e6))
+
+print("\nSame candidates with 1 and 4 workers:", pool_candidates(1, 10, 40) == pool_candidates(4, 10, 40))
+
+print("\nLevenshtein distance per call")
+print("Steps\tTable\t\tBit-parallel")
+for length in [4, 16, 32, 64]:
+    table, bits = levenshtein_speed(length, 2000)
+    print("{:d}\t{:.1f} us\t{:.1f} us".format(length, table * 1e6, bits * 1e6))
+
+print("\nCombining a progression & rhythm per call")
+print("Recursive\tIterative\tMemoized")
+recursive, iterative, memoized = combine_speed(5000)
+print("{:.1f} us\t\t{:.1f} us\t\t{:.1f} us".format(recursive * 1e6, iterative * 1e6, memoized * 1e6))
+
+print("\nDrawing a rhythm / progression per call")
+print("Player\tLibrary\t\t\tMarkov")
+for cls in [Chord_Player, Melody_Player]:
+    rhythm, progression, markov_rhythm, markov_progression = sampler_speed(cls, 5000)
+    print("{:s}\t{:.1f} / {:.1f} us\t\t{:.1f} / {:.1f} us".format(cls.ID, rhythm * 1e6, progression * 1e6, markov_rhythm * 1e6, markov_progression * 1e6))
\ No newline at end of file
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:05:42 2026
+
+@author: beaun
+"""
+
+import threading
+import itertools
+from types import MappingProxyType
+
+
+
+"""
+Double buffered output board, used by the players to share what they play each 16th note.
+Players publish into the back buffer of a 16th note before it is released,
+the drummer swaps it to the front when releasing it and everyone reads that (immutable) front.
+Publishing is lock free: each player only writes its own entry and counts itself in,
+the last player of a 16th note takes the lock to wake up the drummer.
+"""
+class Board:
+
+    """
+    Constructor
+    """
+    def __init__(self, players: int):
+
+        # Number of players that publish every 16th note
+        self.players = players
+
+        # Back buffers, one for even and one for odd 16th notes
+        self.buffers = [dict(), dict()]
+
+        # Front buffer: the last released 16th note and what everyone played on it
+        self.front = (-1, MappingProxyType(dict()))
+
+        # Number of players that published, one counter for even and one for odd 16th notes
+        # (counting is atomic, the counter of a 16th note is replaced when it is swapped to the front)
+        self.counters = [itertools.count(1), itertools.count(1)]
+
+        # Last 16th note every player published, notified when it changes
+        self.completed = -1
+        self.condition = threading.Condition()
+
+
+
+    """ WRITING """
+
+    """
+    Publish what a player plays on the ith 16th note.
+    Entries are stamped with the 16th note, so leftovers from 2 16th notes ago are ignored.
+    """
+    def publish(self, i: int, ID: str, entry: tuple):
+
+        self.buffers[i % 2][ID] = (i, entry)
+
+        # The last player to publish wakes up whoever is waiting
+        if next(self.counters[i % 2]) == self.players:
+            with self.condition:
+                self.completed = i
+                self.condition.notify_all()
+
+
+
+    """
+    Check whether every player has published the ith 16th note
+    """
+    def complete(self, i: int):
+        return self.completed >= i
+
+
+
+    """
+    Wait until every player has published the ith 16th note
+    """
+    def wait(self, i: int):
+        with self.condition:
+            self.condition.wait_for(lambda: self.complete(i))
+
+
+
+    """
+    Move the back buffer of the ith 16th note to the front
+    (called once every player published it, so nobody writes to it anymore)
+    """
+    def swap(self, i: int):
+
+        # Only keep entries of this 16th note
+        entries = {ID: entry for ID, (tick, entry) in self.buffers[i % 2].items() if tick == i}
+
+        self.front = (i, MappingProxyType(entries))
+
+        # Nobody publishes the 16th note after the next one before it is released, then counting starts over
+        self.counters[i % 2] = itertools.count(1)
+
+
+
+    """ READING """
+
+    """
+    Return what everyone played on the ith 16th note,
+    or None if the ith 16th note is not in front
+    """
+    def read(self, i: int):
+
+        tick, entries = self.front
+
+        if tick != i:
+            return None
+
+        return entries
+
+
+
+"""
+Mailbox for messages between 2 players (i.e. the basslines from the chord player to the bass player).
+Messages are kept under the 16th note they are for, so the receiver always takes the one for its own 16th note
+(a later message for the same 16th note replaces the earlier one). Sending never waits.
+"""
+class Mailbox:
+
+    """
+    Constructor
+    """
+    def __init__(self):
+        self.messages = dict()
+        self.condition = threading.Condition()
+
+
+
+    """
+    Send a message for a 16th note
+    """
+    def send(self, tick, message):
+        with self.condition:
+            self.messages[tick] = message
+            self.condition.notify_all()
+
+
+
+    """
+    Return the message for a 16th note (call wait first when running in threads),
+    the messages for earlier 16th notes are discarded
+    """
+    def receive(self, tick):
+        with self.condition:
+            for old in [old for old in self.messages if old < tick]:
+                del self.messages[old]
+            return self.messages.get(tick)
+
+
+
+    """
+    Check whether the message for a 16th note arrived
+    """
+    def ready(self, tick):
+        return tick in self.messages
+
+
+
+    """
+    Block the thread until the message for a 16th note arrived
+    """
+    def wait(self, tick):
+        with self.condition:
+            self.condition.wait_for(lambda: self.ready(tick))
\ No newline at end of file
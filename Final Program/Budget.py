@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 12:52:27 2026
+
+@author: beaun
+"""
+
+import threading
+import time
+
+
+
+# Time kept free before each deadline for playing and syncing (in seconds)
+MARGIN = 0.003
+
+# How quickly the measured cost of a candidate follows new measurements (between 0 and 1)
+SMOOTHING = 0.2
+
+
+
+"""
+Adaptive deliberation budget. Every 16th note, it measures how much time is left until the deadline
+and divides it over the players, based on how expensive their candidates are
+and how many candidates they can use (a player never gets more than it needs, the rest goes to the others).
+While deliberating, it predicts how many more candidates will fit before the deadline.
+Everything is measured in wall time, so it also holds when the candidates are searched by worker processes.
+"""
+class Budget_Controller:
+
+    """
+    Constructor
+    """
+    def __init__(self, clock, players, margin = MARGIN):
+
+        self.clock = clock
+        self.margin = margin
+        self.lock = threading.Lock()
+
+        # How many candidates each player can use per 16th note
+        self.targets = {player.ID: player.candidate_target for player in players}
+
+        # Measured time per candidate (unknown at the start)
+        self.costs = {player.ID: None for player in players}
+
+        # Budget of each player for the current 16th note
+        self.tick = -1
+        self.shares = dict()
+
+        # When each player started deliberating
+        self.starts = dict()
+
+        # Metrics: 16th notes, total budget, total candidates and total deliberation time per player
+        self.metrics = {player.ID: [0, 0, 0, 0] for player in players}
+
+
+
+    """ PLANNING """
+
+    """
+    Divide the time until the deadline of the ith 16th note over the players
+    """
+    def plan(self, i: int):
+
+        # Slack of this 16th note
+        total = max(0, self.clock.remaining(i) - self.margin)
+
+        # Time needed by each player to consider all the candidates it can use
+        demands = dict()
+        for ID, target in self.targets.items():
+            cost = self.costs.get(ID)
+            if target == 0:
+                demands[ID] = 0
+            elif cost is None:
+                demands[ID] = None
+            else:
+                demands[ID] = target * cost
+
+        self.shares = allocate(total, demands)
+        self.tick = i
+
+
+
+    """
+    Start the deliberation of a player, return its budget (in seconds)
+    """
+    def start(self, player):
+
+        with self.lock:
+
+            # The first player of a 16th note plans it
+            if self.tick != player.tick:
+                self.plan(player.tick)
+
+            self.starts[player.ID] = time.time()
+
+            return self.shares.get(player.ID)
+
+
+
+    """
+    Predict how many more candidates fit in the player's budget and before the deadline
+    (at least 1 while the player has no candidates to select from, even when the band is behind)
+    """
+    def affordable(self, player, considered: int):
+
+        # Players that don't use any candidates
+        if self.targets.get(player.ID) == 0:
+            return 0
+
+        cost = self.costs.get(player.ID)
+
+        # Without a measurement, try 1 candidate to measure it
+        if cost is None:
+            return 1 if considered == 0 else 0
+
+        # (A measurement can round down to 0)
+        cost = max(cost, 1e-6)
+
+        # How many fit in the budget
+        budget = (self.shares.get(player.ID) - (time.time() - self.starts.get(player.ID))) / cost
+
+        # How many finish before the deadline (the measured cost already includes the other players slowing it down)
+        deadline = (self.clock.remaining(player.tick) - self.margin) / cost
+
+        # Never leave a sequence without candidates
+        minimum = 1 if considered == 0 and len(player.candidates) == 0 else 0
+
+        return max(minimum, int(min(budget, deadline)))
+
+
+
+    """
+    End the deliberation of a player and measure the cost of its candidates
+    """
+    def finish(self, player, considered: int):
+
+        elapsed = time.time() - self.starts.get(player.ID)
+
+        # Update the cost per candidate
+        if considered > 0:
+            cost = elapsed / considered
+            previous = self.costs.get(player.ID)
+            self.costs[player.ID] = cost if previous is None else previous + SMOOTHING * (cost - previous)
+
+        # Update metrics
+        metrics = self.metrics.get(player.ID)
+        metrics[0] += 1
+        metrics[1] += self.shares.get(player.ID)
+        metrics[2] += considered
+        metrics[3] += elapsed
+
+
+
+    """ METRICS """
+
+    """
+    Summarise, per player, the average budget (in seconds) and candidates per 16th note,
+    and the yield (candidates per second of deliberation)
+    """
+    def report(self):
+
+        report = dict()
+
+        for ID, (ticks, budget, candidates, elapsed) in self.metrics.items():
+
+            if ticks == 0:
+                report[ID] = {'budget': 0, 'candidates': 0, 'yield': 0}
+                continue
+
+            report[ID] = {
+                'budget':       budget / ticks,
+                'candidates':   candidates / ticks,
+                'yield':        candidates / elapsed if elapsed > 0 else 0}
+
+        return report
+
+
+
+"""
+Divide a total over a set of demands. Everyone gets an equal share,
+demands that are lower than their share are met and the rest is divided over the others.
+(A demand of None is unlimited)
+"""
+def allocate(total, demands):
+
+    shares = dict()
+    remaining = dict(demands)
+
+    while len(remaining) > 0:
+
+        share = total / len(remaining)
+
+        # Demands that can be met
+        met = {ID: demand for ID, demand in remaining.items() if demand is not None and demand <= share}
+
+        # Everyone left gets an equal share
+        if len(met) == 0:
+            for ID in remaining.keys():
+                shares[ID] = share
+            break
+
+        for ID, demand in met.items():
+            shares[ID] = demand
+            total -= demand
+            remaining.pop(ID)
+
+    return shares
\ No newline at end of file
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:49:38 2026
+
+@author: beaun
+"""
+
+from Chord_Player import Chord_Player
+from Melody_Player import Melody_Player
+from Drum_Player import Drum_Player
+from Bass_Player import Bass_Player
+
+from Pattern_Library import build, up_to_date, bundle_folder
+
+
+
+""" BUILD """
+
+# Compile the libraries of every player (only the ones that changed)
+paths = set()
+for player in [Bass_Player, Chord_Player, Melody_Player, Drum_Player]:
+    paths.update(player.libraries.values())
+
+for path in sorted(paths):
+    
+    if up_to_date(path):
+        print("Up to date:\t", path)
+        continue
+    
+    build(path)
+    print("Compiled:\t", path, "->", bundle_folder(path))
\ No newline at end of file
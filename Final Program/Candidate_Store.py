@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:19:04 2026
+
+@author: beaun
+"""
+
+import heapq
+import itertools
+
+
+
+# Number of candidates kept per preference profile
+CAPACITY = 64
+
+
+
+"""
+Turn a sequence (nested lists) into something that can be hashed
+"""
+def freeze(sequence):
+
+    if type(sequence) in [list, tuple]:
+        return tuple(freeze(element) for element in sequence)
+
+    return sequence
+
+
+
+"""
+Bounded store of candidates. For each preference profile it keeps only the [capacity] best candidates,
+the worst one is evicted when a better one comes in. Candidates are deduplicated by their sequence.
+Each profile has a min heap (to find the best) and a max heap (to find the worst).
+Entries that are evicted or re-scored are left in the heaps and skipped when they come up.
+"""
+class Candidate_Store:
+
+    """
+    Constructor
+    """
+    def __init__(self, capacity = CAPACITY):
+
+        self.capacity = capacity
+
+        # Candidates by sequence: [scores, sequence, version, number of profiles it is kept for]
+        self.entries = dict()
+
+        # Cost function, heaps and kept candidates (with their version) of each profile
+        self.profiles = dict()
+        self.best = dict()
+        self.worst = dict()
+        self.kept = dict()
+
+        # Tie breaker for the heaps
+        self.counter = itertools.count()
+
+
+
+    """
+    Return the number of candidates
+    """
+    def __len__(self):
+        return len(self.entries)
+
+
+
+    """ PROFILES """
+
+    """
+    Add a preference profile, given a function that turns scores into a cost (lower is better).
+    Existing candidates are ranked for it as well.
+    """
+    def register(self, profile, cost):
+
+        if profile in self.profiles:
+            return
+
+        self.profiles[profile] = cost
+        self.best[profile] = list()
+        self.worst[profile] = list()
+        self.kept[profile] = dict()
+
+        for key, entry in list(self.entries.items()):
+            self.keep(profile, key, entry)
+
+
+
+    """ CANDIDATES """
+
+    """
+    Add a candidate (or update the scores of a sequence that is already in the store).
+    The hashable form of the sequence can be given if it is already known.
+    """
+    def add(self, scores, sequence, key = None):
+
+        if key is None:
+            key = freeze(sequence)
+
+        # New version of an existing candidate (its old heap entries become invalid)
+        if key in self.entries:
+            entry = self.entries.get(key)
+            entry[0] = scores
+            entry[2] += 1
+        else:
+            entry = [scores, sequence, 0, 0]
+            self.entries[key] = entry
+
+        for profile in self.profiles.keys():
+            self.keep(profile, key, entry)
+
+        # Not good enough for any profile
+        if entry[3] == 0 and len(self.profiles) > 0:
+            self.entries.pop(key, None)
+
+
+
+    """
+    Keep a candidate for a profile, evict the worst if there are too many
+    """
+    def keep(self, profile, key, entry):
+
+        scores, _, version, _ = entry
+        cost = self.profiles.get(profile)(scores)
+        kept = self.kept.get(profile)
+
+        # A new candidate that is not better than the worst one of a full profile is not kept
+        if key not in kept and len(kept) >= self.capacity and cost >= self.worst_cost(profile):
+            return
+
+        count = next(self.counter)
+
+        # (It may have been evicted by another profile already)
+        self.entries[key] = entry
+        if key not in kept:
+            entry[3] += 1
+        kept[key] = version
+
+        heapq.heappush(self.best.get(profile), (cost, count, key, version))
+        heapq.heappush(self.worst.get(profile), (-cost, count, key, version))
+
+        # Evict the worst
+        while len(kept) > self.capacity:
+            _, _, worst, version = heapq.heappop(self.worst.get(profile))
+            if kept.get(worst) == version:
+                self.drop(profile, worst)
+
+        # Clean up the heaps when they are mostly invalid entries
+        if len(self.best.get(profile)) > 4 * self.capacity:
+            self.compact(profile)
+
+
+
+    """
+    Return the cost of the worst candidate of a profile (invalid entries on top of the heap are thrown away)
+    """
+    def worst_cost(self, profile):
+
+        heap = self.worst.get(profile)
+        kept = self.kept.get(profile)
+
+        while kept.get(heap[0][2]) != heap[0][3]:
+            heapq.heappop(heap)
+
+        return -heap[0][0]
+
+
+
+    """
+    Stop keeping a candidate for a profile
+    """
+    def drop(self, profile, key):
+
+        self.kept.get(profile).pop(key)
+
+        entry = self.entries.get(key)
+        entry[3] -= 1
+
+        # Not kept for any profile anymore
+        if entry[3] == 0:
+            self.entries.pop(key)
+
+
+
+    """
+    Rebuild the heaps of a profile with only valid entries
+    """
+    def compact(self, profile):
+
+        for heap in [self.best.get(profile), self.worst.get(profile)]:
+            valid = [item for item in heap if self.kept.get(profile).get(item[2]) == item[3]]
+            heapq.heapify(valid)
+            heap[:] = valid
+
+
+
+    """
+    Return the best [number] candidates for a profile as (scores, sequence)
+    """
+    def top(self, profile, number = 1):
+
+        heap = self.best.get(profile)
+        kept = self.kept.get(profile)
+
+        # Pop until enough valid entries are found (invalid ones are thrown away)
+        popped = list()
+        while len(heap) > 0 and len(popped) < number:
+            item = heapq.heappop(heap)
+            if kept.get(item[2]) == item[3]:
+                popped.append(item)
+
+        # Put the valid ones back
+        for item in popped:
+            heapq.heappush(heap, item)
+
+        return [tuple(self.entries.get(key)[:2]) for _, _, key, _ in popped]
+
+
+
+    """
+    Return the best sequence for a profile (None if there are no candidates)
+    """
+    def select(self, profile):
+
+        top = self.top(profile)
+
+        if len(top) == 0:
+            return None
+
+        return top[0][1]
+
+
+
+    """
+    Return all candidates as (scores, sequence)
+    """
+    def items(self):
+        return [(scores, sequence) for scores, sequence, _, _ in self.entries.values()]
+
+
+
+    """
+    Remove all candidates (profiles are kept)
+    """
+    def clear(self):
+
+        self.entries = dict()
+        for profile in self.profiles.keys():
+            self.best[profile] = list()
+            self.worst[profile] = list()
+            self.kept[profile] = dict()
\ No newline at end of file
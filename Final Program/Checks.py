@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:02:41 2026
+
+@author: beaun
+"""
+
+import os
+import sys
+import random
+import tempfile
+import mido
+
+from Scale import chord_mask
+from Metrics import levenshtein_table, levenshtein_distance, bounded_levenshtein, bit_levenshtein, batch_levenshtein, pack
+from Combiner import combine, recursive_combine, fill
+from Pattern_Library import load, length_index
+from Variations import split_rhythm, join_rhythm, shift_rhythm
+
+# The extraction code is kept in its own folder, next to this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MIDI Extraction"))
+
+from MIDI_Extractor import period, read_file, read_events
+
+
+
+"""
+Regression checks: each fast version of a function is compared with the simple version it replaced
+(the batch scoring and worker pool checks are part of the benchmarks).
+Every check returns the number of cases it compared and raises an AssertionError on the first mismatch.
+"""
+
+
+
+""" LOOP PERIOD """
+
+"""
+Return the shortest period of a sequence by trying every period from short to long
+"""
+def brute_period(sequence):
+
+    for p in range(1, len(sequence) + 1):
+        if all([sequence[i] == sequence[i - p] for i in range(p, len(sequence))]):
+            return p
+
+    return 0
+
+
+
+"""
+Compare the prefix function period with the brute force one,
+on random sequences that repeat a random pattern (and may be cut off or changed at the end)
+"""
+def period_check(cases):
+
+    for _ in range(cases):
+
+        pattern = [random.randint(0, 3) for _ in range(random.randint(1, 6))]
+        sequence = (pattern * random.randint(1, 5))[:random.randint(0, 30)]
+        if len(sequence) > 0 and random.random() < 0.3:
+            sequence[random.randrange(len(sequence))] = random.randint(0, 3)
+
+        assert period(sequence) == brute_period(sequence), sequence
+
+    return cases
+
+
+
+""" MIDI READER """
+
+"""
+Write a random MIDI file: a few tracks of notes, tempo changes and other messages
+"""
+def random_midi(path):
+
+    MIDI = mido.MidiFile(type = random.choice([0, 1]), ticks_per_beat = random.choice([96, 384, 480, 1000]))
+
+    for _ in range(1 if MIDI.type == 0 else random.randint(1, 4)):
+
+        track = mido.MidiTrack()
+        MIDI.tracks.append(track)
+
+        for _ in range(random.randint(0, 60)):
+
+            kind = random.random()
+            time = random.choice([0, 0, 1, 7, 48, 120, 240, 480, 1000])
+
+            if kind < 0.4:
+                track.append(mido.Message('note_on', note = random.randint(0, 127), velocity = random.choice([0, 64]), time = time))
+            elif kind < 0.7:
+                track.append(mido.Message('note_off', note = random.randint(0, 127), time = time))
+            elif kind < 0.8:
+                track.append(mido.MetaMessage('set_tempo', tempo = random.randint(200000, 1500000), time = time))
+            elif kind < 0.9:
+                track.append(mido.Message('control_change', control = 7, value = 100, time = time))
+            else:
+                track.append(mido.MetaMessage('text', text = "check", time = time))
+
+        track.append(mido.MetaMessage('end_of_track', time = random.choice([0, 480])))
+
+    MIDI.save(path)
+
+
+
+"""
+Compare the streaming reader with the mido reader (with each chord turned into its pitch classes),
+on random MIDI files
+"""
+def reader_check(cases):
+
+    with tempfile.TemporaryDirectory() as folder:
+
+        for i in range(cases):
+
+            path = os.path.join(folder, "{:d}.mid".format(i))
+            random_midi(path)
+
+            expected = [(chord_mask(chord), length) for chord, length in read_file(path)]
+            assert list(read_events(path)) == expected, path
+
+    return cases
+
+
+
+""" LEVENSHTEIN """
+
+"""
+Compare every levenshtein kernel with the full table, on random rhythm grids of different lengths
+"""
+def levenshtein_check(cases):
+
+    for _ in range(cases):
+
+        s1 = [random.randint(0, 1) for _ in range(random.randint(0, 64))]
+        batch = [[random.randint(0, 1) for _ in range(random.randint(1, 64))] for _ in range(4)]
+        bound = random.randint(0, 8)
+
+        for s2 in batch:
+            distance = levenshtein_table(s1, s2)
+            assert bit_levenshtein(s1, s2) == distance, (s1, s2)
+            assert levenshtein_distance(s1, s2) == distance, (s1, s2)
+            assert bounded_levenshtein(s1, s2, bound) == min(distance, bound + 1), (s1, s2, bound)
+
+        if len(s1) > 0:
+            distances = batch_levenshtein(s1, *pack(batch))
+            assert list(distances) == [levenshtein_table(s1, s2) for s2 in batch], (s1, batch)
+
+    return cases
+
+
+
+""" COMBINER """
+
+"""
+Compare the iterative combine with the recursive one, on the progressions & rhythms of the chord player
+and variations of the rhythms
+"""
+def combine_check(cases):
+
+    progressions = length_index(load("Patterns/Chords/progressions.txt"))
+    rhythms = length_index(load("Patterns/Chords/rhythms (16).txt"))
+
+    fill.cache_clear()
+
+    for _ in range(cases):
+
+        rhythm = random.choice([split_rhythm, join_rhythm, shift_rhythm])(rhythms.at_least(progressions.minimum))
+        progression = progressions.at_most(len(rhythm))
+
+        assert combine(progression, rhythm) == recursive_combine(progression, rhythm), (progression, rhythm)
+
+    return cases
+
+
+
+""" CHECKS """
+
+print("\nLoop period:\t\t{:d} sequences match".format(period_check(5000)))
+print("MIDI reader:\t\t{:d} files match".format(reader_check(200)))
+print("Levenshtein kernels:\t{:d} grids match".format(levenshtein_check(2000)))
+print("Combiner:\t\t{:d} pairs match".format(combine_check(5000)))
\ No newline at end of file
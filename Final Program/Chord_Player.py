@@ -5,19 +5,25 @@ Created on Mon Mar 25 15:17:41 2024
 @author: beaun
 """
 
+import os
 import random
 from Random_Configuration import set_seed
 set_seed()
 
 from Player import Player
+from Pattern_Library import length_index
+from Markov import markov_model
 
-from Invertor import invert_progression
-from Combiner import combine
+from Invertor import lead_voices
+from Combiner import combine, precompute
 
 from Variations import turn_around, relative_variation, relative_progression
 from Variations import split_rhythm, join_rhythm, shift_rhythm
 
-from Metrics import levenshtein_distance, pairwise_difference, rhythm_grid
+from Metrics import levenshtein_distance, pairwise_difference, rhythm_grid, Pairwise_Difference
+from Metrics import pack, rhythm_grids, batch_levenshtein, batch_pairwise_difference
+
+import numpy as np
 
 
 
@@ -34,6 +40,12 @@ class Chord_Player(Player):
         'rhythms':      "Patterns/Chords/rhythms (16).txt"
         }
     
+    # N-gram models of the corpus the libraries were extracted from (see Markov)
+    models = {
+        'progressions': "Patterns/Chords/progressions (extraction) model.npz",
+        'rhythms':      "Patterns/Chords/rhythms (extraction) model.npz"
+        }
+    
     general_preference = (2, 2, 2, 2)
     
     
@@ -109,19 +121,18 @@ class Chord_Player(Player):
         
         # Unpack sequence
         progression, _ = sequence
+        
+        # Propose a rhythm that is likely in the corpus
+        rhythm = self.propose('rhythms', len(progression))
+        if rhythm is not None:
+            return rhythm
             
-        # Get a random rhythm that is bigger than the progression
-        rhythm = random.choice(self.libraries.get('rhythms'))
-        tries = 1
-        while len(rhythm) < len(progression):
-            rhythm = random.choice(self.libraries.get('rhythms'))
-            tries += 1
-            
-            # If it takes too long, return the original
-            if tries > 10:
-                return sequence[1]
+        # If no rhythm is big enough, return the original
+        if self.lengths.get('rhythms').count(len(progression)) == 0:
+            return sequence[1]
             
-        return rhythm
+        # Get a random rhythm that is bigger than the progression
+        return self.lengths.get('rhythms').at_least(len(progression))
     
     
     
@@ -132,19 +143,18 @@ class Chord_Player(Player):
         
         # Unpack sequence
         _, rhythm = sequence
+        
+        # Propose a progression that is likely in the corpus
+        progression = self.propose('progressions', 1, len(rhythm))
+        if progression is not None:
+            return progression
             
-        # Get a random rhythm that is bigger than the progression
-        progression = random.choice(self.libraries.get('progressions'))
-        tries = 1
-        while len(progression) > len(rhythm):
-            rhythm = random.choice(self.libraries.get('progressions'))
-            tries += 1
-            
-            # If it takes too long, return the original
-            if tries > 10:
-                return sequence[0]
+        # If no progression is small enough, return the original
+        if self.lengths.get('progressions').count(0, len(rhythm)) == 0:
+            return sequence[0]
             
-        return progression
+        # Get a random progression that is smaller than the rhythm
+        return self.lengths.get('progressions').at_most(len(rhythm))
     
     
     
@@ -153,19 +163,18 @@ class Chord_Player(Player):
     """
     def random_sequence(self):
         
-        # Get a random rhythm & progression
-        progression = random.choice(self.libraries.get('progressions'))
-        rhythm = random.choice(self.libraries.get('rhythms'))
+        progressions, rhythms = self.lengths.get('progressions'), self.lengths.get('rhythms')
         
-        # Assure the rhythm sequence contains more chords than the progression
-        # If it takes more than 5 tries, get another rhythm
-        tries = 1
-        while len(progression) > len(rhythm):
-            tries += 1
-            progression = random.choice(self.libraries.get('progressions'))
-            if tries > 5:
-                rhythm = random.choice(self.libraries.get('rhythms'))
-                tries = 1
+        # Propose a rhythm that is likely in the corpus, or get a random rhythm that fits at least one progression
+        rhythm = self.propose('rhythms', progressions.minimum)
+        if rhythm is None:
+            rhythm = rhythms.at_least(progressions.minimum)
+        
+        # Propose a progression that is likely in the corpus, or get a random progression,
+        # that contains no more chords than the rhythm
+        progression = self.propose('progressions', 1, len(rhythm))
+        if progression is None:
+            progression = progressions.at_most(len(rhythm))
         
         return progression, rhythm
     
@@ -226,6 +235,69 @@ class Chord_Player(Player):
     
     
     
+    """
+    Calculate the scores of a block of sequences given a memory chunk, all at once
+    """
+    def score_batch(self, memory, sequences):
+        
+        progressions = [progression for progression, _ in sequences]
+        rhythms = [rhythm for _, rhythm in sequences]
+        grids, steps = rhythm_grids(rhythms)
+        
+        none = np.zeros(len(sequences), dtype = np.int64)
+        continuity, energy, drum_match, melody_match = none, none, none, none
+        
+        # Calculate metrics
+        if self.reflection:
+            p1, r1 = memory.get(self.ID)
+            packed, lengths = pack(progressions)
+            continuity = batch_levenshtein(rhythm_grid(r1), grids, steps) + batch_levenshtein(p1, packed, lengths)
+            energy = np.abs(len(p1) + len(r1) - lengths - np.array([len(rhythm) for rhythm in rhythms]))
+            
+        if self.cooperation:
+            drum_grid = [1 if 'kick' in step or 'snare' in step else 0 for step, _ in memory.get('Drums')]
+            melody_grid = rhythm_grid([length for _, length in memory.get('Melody')])
+            drum_match = batch_pairwise_difference(drum_grid, grids, steps)
+            melody_match = batch_pairwise_difference(melody_grid, grids, steps)
+            
+        return list(zip(continuity.tolist(), energy.tolist(), drum_match.tolist(), melody_match.tolist()))
+    
+    
+    
+    """
+    Create the scoring state of a sequence.
+    The scores against its own sequence don't change during a sequence,
+    the rhythm overlaps are extended as the other players' rhythms come in.
+    """
+    def scoring_state(self, memory, sequence):
+        
+        continuity = self.continuity(memory, sequence)                  if self.reflection else 0
+        energy = self.energy_consistency(memory.get(self.ID), sequence) if self.reflection else 0
+        
+        _, rhythm = sequence
+        grid = rhythm_grid(rhythm)
+        
+        return continuity, energy, Pairwise_Difference(grid), Pairwise_Difference(grid)
+    
+    
+    
+    """
+    Update a scoring state with the new steps in the memory and return the score
+    """
+    def update_state(self, state, memory):
+        
+        continuity, energy, drum_overlap, melody_overlap = state
+        
+        if not self.cooperation:
+            return continuity, energy, 0, 0
+        
+        drum_grid = [1 if 'kick' in step or 'snare' in step else 0 for step, _ in memory.get('Drums')]
+        melody_grid = rhythm_grid([length for _, length in memory.get('Melody')])
+        
+        return continuity, energy, drum_overlap.extend(drum_grid), melody_overlap.extend(melody_grid)
+    
+    
+    
     """
     Generate a random variation given a sequence
     """
@@ -274,28 +346,31 @@ class Chord_Player(Player):
     """
     def start_sequence(self):
         
-        # Get a random rhythm & progression
-        progression = random.choice(self.libraries.get('progressions'))
-        rhythm = random.choice(self.libraries.get('rhythms'))
+        progressions, rhythms = self.lengths.get('progressions'), self.lengths.get('rhythms')
         
-        # Assure the rhythm sequence contains more chords than the progression
-        # If it takes more than 5 tries, get another rhythm
-        tries = 1
-        while len(progression) > len(rhythm) or len(progression) < 3:
-            tries += 1
-            progression = random.choice(self.libraries.get('progressions'))
-            if tries > 5:
-                rhythm = random.choice(self.libraries.get('rhythms'))
-                tries = 1
+        # The rhythm needs at least as many chords as the shortest progression of at least 3 chords
+        # (or as the longest progression, if there are none that long)
+        fewest = progressions.shortest(3)
+        
+        # Propose a rhythm that is likely in the corpus, or get a random one, that fits at least one of those progressions
+        rhythm = self.propose('rhythms', fewest)
+        if rhythm is None:
+            rhythm = rhythms.at_least(fewest)
+        
+        # Propose a progression of at least 3 chords that is likely in the corpus, or get a random one,
+        # that contains no more chords than the rhythm
+        progression = self.propose('progressions', min(3, fewest), len(rhythm))
+        if progression is None:
+            progression = progressions.sample(min(3, fewest), len(rhythm))
         
         return progression, rhythm
     
     
     
     """
-    Generate a base sequence
+    Preference profile of a base sequence
     """
-    def base_sequence(self):
+    def base_profile(self):
         
         # Set metric preferences & weights
         continuity =    5,  2
@@ -316,14 +391,14 @@ class Chord_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
     """
-    Make a variation on a given base pattern
+    Preference profile of a minor variation
     """
-    def minor_variation(self):
+    def minor_profile(self):
         
         # Set metric preferences & weights
         continuity =    2,  2
@@ -344,14 +419,14 @@ class Chord_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
     """
-    Make a variation on a given base pattern
+    Preference profile of a major variation
     """
-    def major_variation(self):
+    def major_profile(self):
         
         # Set metric preferences & weights
         continuity =    5,  2
@@ -372,15 +447,14 @@ class Chord_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
     """
-    Apply variation on a whole section, only making minor changes,
-    to keep things both fresh and familiar
+    Preference profile of a section variation
     """
-    def section_variation(self):
+    def section_profile(self):
         
         # Set metric preferences & weights
         continuity =    2,  3
@@ -401,14 +475,14 @@ class Chord_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
         
         
         
     """
-    Generates a pattern for the end of a phrase, moving it into the next
+    Preference profile of a sequence that ends a phrase
     """
-    def phrase_end(self):
+    def end_profile(self):
         
         # Set metric preferences & weights
         continuity =    5,  2
@@ -429,7 +503,7 @@ class Chord_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
@@ -447,11 +521,8 @@ class Chord_Player(Player):
         # Send bass notes to bass player
         self.send_bass(progression, rhythm)
         
-        # Turn progression into notes
-        chords = [self.scale.triad(chord, - 1) for chord in progression]
-        
-        # Invert chords to be closer together
-        chords = invert_progression(chords)
+        # Turn progression into notes, inverted to move as little as possible
+        chords = lead_voices(self.scale, progression, - 1)
         
         # Zip contents
         MIDI = list(zip(chords, rhythm))
@@ -460,10 +531,30 @@ class Chord_Player(Player):
 
 
 
+    """ OVERWRITTEN FUNCTIONS """
+    
+    """
+    Import the pattern libraries, index the progressions and rhythms by their number of chords,
+    load the corpus models (if they were extracted)
+    and combine every progression with every rhythm ahead of time
+    """
+    def import_libraries(self):
+        
+        super().import_libraries()
+        
+        self.lengths = {key: length_index(library) for key, library in self.libraries.items()}
+        
+        # (The models only propose patterns once they were extracted from the corpus)
+        self.markov = {key: markov_model(path) for key, path in self.models.items() if os.path.exists(path)}
+        
+        precompute(self.libraries.get('progressions'), self.libraries.get('rhythms'))
+    
+    
+    
     """ BASS """ 
   
     """
-    Given a progression and rhythm, write the bassline and send it to the output
+    Given a progression and rhythm, write the bassline and send it to the bass player (for the current 16th note)
     """
     def send_bass(self, progression: list, rhythm: list):
         
@@ -473,9 +564,5 @@ class Chord_Player(Player):
         # Create bassline
         bassline = list(zip(notes, rhythm))
         
-        # Write bassline to dictionary
-        with self.lock:
-            self.output['Bass'] = bassline
-            
-        # Notify bass player
-        self.bass_output.wait()
\ No newline at end of file
+        # Send bassline to the bass player
+        self.bass_output.send(self.tick, bassline)
\ No newline at end of file
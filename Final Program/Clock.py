@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:31 2026
+
+@author: beaun
+"""
+
+import time
+
+
+
+# Delays the off-beats for a more swingy feeling
+SWING = 0.2
+
+# How long before a deadline the clock stops sleeping and starts spinning (in seconds)
+TOLERANCE = 0.002
+
+
+
+"""
+Conductor clock. Every 16th note gets a deadline that is calculated from a fixed
+starting point, so a late tick does not push back all of the ticks after it.
+The drummer waits for these deadlines and releases the other players.
+"""
+class Clock:
+
+    """ VARIABLES """
+
+    # Whether the clock follows the wall clock
+    realtime = True
+
+
+
+    """
+    Constructor
+    """
+    def __init__(self, BPM, swing = SWING, tolerance = TOLERANCE):
+
+        self.BPM = BPM
+        self.swing = swing
+        self.tolerance = tolerance
+
+        # Length of a 16th note (in seconds)
+        self.step = (60 / BPM) / 4
+
+        # Time of the first 16th note (set when the clock starts)
+        self.origin = None
+
+        # Last 16th note that has been released to the players
+        self.tick = -1
+
+        # How late each 16th note was played (in seconds)
+        self.lateness = list()
+
+
+
+    """ TIMING """
+
+    """
+    Return the current time (in seconds) on a monotonic clock
+    """
+    def now(self):
+        return time.perf_counter()
+
+
+
+    """
+    Fix the starting point of the clock. The first 16th note is due one 16th note later.
+    """
+    def start(self):
+        self.origin = self.now() + self.step
+
+
+
+    """
+    Return the deadline of the ith 16th note.
+    Off-beats are delayed by the swing.
+    """
+    def deadline(self, i: int):
+
+        # Start the clock if nobody has done so yet
+        if self.origin is None:
+            self.start()
+
+        deadline = self.origin + i * self.step
+
+        # Add swing
+        if i % 2 == 1:
+            deadline += self.swing * self.step
+
+        return deadline
+
+
+
+    """
+    Return how much time is left until the deadline of the ith 16th note
+    """
+    def remaining(self, i: int):
+        return self.deadline(i) - self.now()
+
+
+
+    """
+    Wait for the deadline of the ith 16th note and return how late it was.
+    Sleeping can overshoot, so it sleeps until [tolerance] before the deadline
+    and spins for the rest.
+    """
+    def wait(self, i: int):
+
+        deadline = self.deadline(i)
+
+        # Sleep for most of the remaining time
+        remaining = deadline - self.now() - self.tolerance
+        if remaining > 0:
+            time.sleep(remaining)
+
+        # Spin until the deadline
+        while self.now() < deadline:
+            pass
+
+        # Measure lateness
+        lateness = self.now() - deadline
+        self.lateness.append(lateness)
+
+        return lateness
+
+
+
+    """
+    Release the ith 16th note, players waiting for it may continue
+    """
+    def release(self, i: int):
+        self.tick = max(self.tick, i)
+
+
+
+    """ METRICS """
+
+    """
+    Return how far the band is behind the tempo (in seconds).
+    Since every deadline is absolute, this is the lateness of the last 16th note.
+    """
+    def drift(self):
+
+        if len(self.lateness) == 0:
+            return 0
+
+        return self.lateness[-1]
+
+
+
+    """
+    Summarise the lateness of all 16th notes so far
+    """
+    def report(self):
+
+        ticks = len(self.lateness)
+
+        if ticks == 0:
+            return {'ticks': 0, 'mean': 0, 'max': 0, 'late': 0, 'drift': 0}
+
+        return {
+            'ticks':    ticks,
+            'mean':     sum(self.lateness) / ticks,
+            'max':      max(self.lateness),
+            'late':     len([lateness for lateness in self.lateness if lateness > self.tolerance]),
+            'drift':    self.drift()}
+
+
+"""
+Virtual conductor clock for offline rendering.
+Time only moves when a 16th note is released, so waiting for a deadline never sleeps.
+"""
+class Virtual_Clock(Clock):
+
+    """ VARIABLES """
+
+    # Whether the clock follows the wall clock
+    realtime = False
+
+
+
+    """ TIMING """
+
+    """
+    Return the current (virtual) time: the deadline of the last released 16th note
+    """
+    def now(self):
+
+        if self.origin is None:
+            return 0
+
+        return self.deadline(self.tick)
+
+
+
+    """
+    Fix the starting point of the clock at 0
+    """
+    def start(self):
+        self.origin = 0
+
+
+
+    """
+    Every deadline is met instantly
+    """
+    def wait(self, i: int):
+        self.lateness.append(0)
+        return 0
\ No newline at end of file
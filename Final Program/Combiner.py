@@ -5,6 +5,15 @@ Created on Sat May 25 16:12:08 2024
 @author: beaun
 """
 
+import itertools
+from functools import lru_cache
+
+
+
+# Number of combined progressions that are remembered
+SIZE = 16384
+
+
 """ VALUES """
 
 # Ties a value to the 'importance' of a chord / note in scale
@@ -65,12 +74,93 @@ def divide_progression(progression):
         
 
 
+"""
+Split the part of a rhythm between start and end into 2 halves (like divide_rhythm),
+given the prefix sums of the whole rhythm. Returns the position in the whole rhythm.
+"""
+def divide_part(prefix, start, end):
+    
+    # The halfway mark is compared doubled, so it stays in whole numbers
+    total = prefix[end] - prefix[start]
+    
+    # Keep adding chords until it passes the halfway mark
+    i = start + 1
+    while i < end and 2 * (prefix[i] - prefix[start]) < total:
+        i += 1
+        
+    # In case 1 chord less divides the halves better, adjust i
+    if i <= end and abs(total - 2 * (prefix[i - 1] - prefix[start])) < abs(total - 2 * (prefix[i] - prefix[start])):
+        i -= 1
+    
+    return min(i, end)
+
+
+
 """
 Keep splitting both the progression and rhythm into halves until there is 1 chord,
 use that to 'fill in' the matching rhythm. Return a chord progression
 that matches the length of the rhythm.
+(Combinations are remembered, see fill for how they are made)
 """
 def combine(progression, rhythm):
+    return list(fill(tuple(progression), tuple(rhythm)))
+
+
+
+"""
+Combine a progression and rhythm (as tuples) without recursion: the halves that still need to be split
+are kept on a stack, and the rhythm is split using its prefix sums instead of summing it again at every level.
+"""
+@lru_cache(maxsize = SIZE)
+def fill(progression, rhythm):
+    
+    if len(progression) == 0:
+        raise ValueError("Can't combine an empty progression")
+    
+    prefix = list(itertools.accumulate(rhythm, initial = 0))
+    combined = list()
+    
+    # Parts left to fill (start & end of the progression and the rhythm), the first half is on top
+    parts = [(0, len(progression), 0, len(rhythm))]
+    
+    while len(parts) > 0:
+        
+        p_start, p_end, r_start, r_end = parts.pop()
+        
+        # Base case
+        if p_end - p_start == 1:
+            combined.extend([progression[p_start]] * (r_end - r_start))
+            continue
+        
+        # Split Chords
+        p = p_start + divide_progression(progression[p_start:p_end])
+        
+        # Split Rhythm
+        r = divide_part(prefix, r_start, r_end)
+        
+        parts.append((p, p_end, r, r_end))
+        parts.append((p_start, p, r_start, r))
+    
+    return tuple(combined)
+
+
+
+"""
+Combine every progression with every rhythm it fits in ahead of time
+"""
+def precompute(progressions, rhythms):
+    
+    for progression in progressions:
+        for rhythm in rhythms:
+            if len(progression) <= len(rhythm):
+                fill(tuple(progression), tuple(rhythm))
+
+
+
+"""
+Original (recursive) version of combine, kept to check the faster one against
+"""
+def recursive_combine(progression, rhythm):
     
     # Base case
     if len(progression) == 1:
@@ -82,4 +172,4 @@ def combine(progression, rhythm):
     # Split Rhythm
     r = divide_rhythm(rhythm)
     
-    return combine(progression[:p], rhythm[:r]) + combine(progression[p:], rhythm[r:])
\ No newline at end of file
+    return recursive_combine(progression[:p], rhythm[:r]) + recursive_combine(progression[p:], rhythm[r:])
\ No newline at end of file
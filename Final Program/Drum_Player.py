@@ -10,17 +10,16 @@ from Random_Configuration import set_seed
 set_seed()
 
 from Player import Player
+from Pattern_Library import pair_index
 
-import time
 import mido
 
-from Metrics import levenshtein_distance, pairwise_difference, rhythm_grid
+from Metrics import levenshtein_distance, pairwise_difference, rhythm_grid, Pairwise_Difference
+from Metrics import pack, batch_levenshtein, batch_pairwise_difference
 
+import numpy as np
 
 
-# Delays the off-beats for a more swingy feeling
-SWING = 0.2
-
 # each drum kit piece with its according MIDI channel
 mapping = {
     'kick':         4,
@@ -54,6 +53,9 @@ class Drum_Player(Player):
     
     general_preference = (2, 2, 3)
     
+    # The drum libraries are small, more candidates don't help much
+    candidate_target = 25
+    
     
     
     """
@@ -64,8 +66,10 @@ class Drum_Player(Player):
         
         super().run()
         
-        # Final sync to get the others out of the loop
-        self.sync(1, 0)
+        # Final release to get the others out of the loop
+        with self.timing:
+            self.clock.release(self.tick)
+            self.timing.notify_all()
             
 
 
@@ -73,39 +77,43 @@ class Drum_Player(Player):
 
     """
     Create a random kick pattern, with at least n, and no more than m kicks
+    (keeps the current pattern, or leaves the kick out, if no pattern has the right number of kicks)
     """
-    def kick(self, n = 1, m = 10):
+    def kick(self, n = 1, m = 10, current = None):
         
-        # determines whether the second half starts with a kick or not
-        library = random.choice(['kick', 'kick (off)'])
+        # determines whether the second half starts with a kick or not,
+        # by how many pairs of halves of each have the right number of kicks (so every pair is equally likely)
+        on, off = self.pairs.get('kick'), self.pairs.get('kick (off)')
+        ons, offs = on.count(n, m), off.count(n, m)
         
-        # Initialise
-        kick = list()
+        if ons + offs == 0:
+            return list(current) if current is not None else [0 for _ in range(16)]
         
-        # Find apropriate kick pattern
-        while sum(kick) < n or sum(kick) > m:
-            kick = random.choice(self.libraries.get('kick')) + random.choice(self.libraries.get(library))
+        # Draw a pair of halves with the right number of kicks
+        first, second = (on if random.random() * (ons + offs) < ons else off).draw(n, m)
 
-        return kick
+        return first + second
     
     
     
     """
     Create a random kick pattern, with at least n, and no more than m kicks
+    (keeps the current pattern, or leaves the snare out, if no pattern has the right number of snares)
     """
-    def snare(self, n = 1, m = 10):
+    def snare(self, n = 1, m = 10, current = None):
         
         # Choose the snare library
         library = random.choice(['snare'])
         
-        # Initialise
-        snare = list()
+        # Draw a pair of halves with the right number of snares
+        pair = self.pairs.get(library).draw(n, m)
+        
+        if pair is None:
+            return list(current) if current is not None else [0 for _ in range(16)]
         
-        # Find apropriate kick pattern
-        while sum(snare) < n or sum(snare) > m:
-            snare = random.choice(self.libraries.get(library)) + random.choice(self.libraries.get(library))
+        first, second = pair
 
-        return snare
+        return first + second
     
     
     
@@ -202,6 +210,74 @@ class Drum_Player(Player):
     
     
     
+    """
+    Calculate the scores of a block of sequences given a memory chunk, all at once
+    """
+    def score_batch(self, memory, sequences):
+        
+        # Pack each kit piece of the sequences
+        pieces = [pack([sequence[i] for sequence in sequences]) for i in range(4)]
+        
+        none = np.zeros(len(sequences), dtype = np.int64)
+        similarity, energy, chords_match = none, none, none
+        
+        # Calculate metrics
+        if self.reflection:
+            own = memory.get(self.ID)
+            similarity = sum([batch_levenshtein(p1, packed, lengths) for p1, (packed, lengths) in zip(own, pieces)])
+            hits = sum([packed.sum(axis = 1) for packed, _ in pieces])
+            energy = np.abs(sum([sum(kit_piece) for kit_piece in own]) - hits)
+            
+        if self.cooperation:
+            
+            # Get drum rhythm grids
+            (kick, kick_lengths), (snare, snare_lengths) = pieces[:2]
+            width = min(kick.shape[1], snare.shape[1])
+            grids = ((kick[:, :width] == 1) | (snare[:, :width] == 1)).astype(np.int64)
+            lengths = np.minimum(kick_lengths, snare_lengths)
+            
+            # Get the rhythm grid from the output
+            rhythm = rhythm_grid([rhythm for _, rhythm in memory.get("Chords")])
+            
+            chords_match = batch_pairwise_difference(rhythm, grids, lengths)
+            
+        return list(zip(similarity.tolist(), energy.tolist(), chords_match.tolist()))
+    
+    
+    
+    """
+    Create the scoring state of a sequence.
+    The scores against its own sequence don't change during a sequence,
+    the rhythm overlap is extended as the chords come in.
+    """
+    def scoring_state(self, memory, sequence):
+        
+        similarity = self.similarity(memory.get(self.ID), sequence)         if self.reflection else 0
+        energy = self.energy_consistency(memory.get(self.ID), sequence)     if self.reflection else 0
+        
+        kick, snare, cymbals, percussion = sequence
+        grid = [1 if kick == 1 or snare == 1 else 0 for (kick, snare) in zip(kick, snare)]
+        
+        return similarity, energy, Pairwise_Difference(grid)
+    
+    
+    
+    """
+    Update a scoring state with the new steps in the memory and return the score
+    """
+    def update_state(self, state, memory):
+        
+        similarity, energy, overlap = state
+        
+        if not self.cooperation:
+            return similarity, energy, 0
+        
+        chords_match = overlap.extend(rhythm_grid([rhythm for _, rhythm in memory.get("Chords")]))
+        
+        return similarity, energy, chords_match
+    
+    
+    
     """
     Given a base pattern, select a random set of kit pieces and swap their pattern
     """
@@ -220,10 +296,10 @@ class Drum_Player(Player):
         for kit_piece in variation:
             
             if kit_piece == 'kick':
-                kick_new = self.kick()
+                kick_new = self.kick(current = kick)
             
             elif kit_piece == 'snare':
-                snare_new = self.snare()
+                snare_new = self.snare(current = snare)
                 
             elif kit_piece == 'cymbals':
                 cymbals_new = self.cymbals()
@@ -252,9 +328,9 @@ class Drum_Player(Player):
     
     
     """
-    Choose a sequence for the base of a section
+    Preference profile of a base sequence
     """
-    def base_sequence(self):
+    def base_profile(self):
         
         # Set metric preferences & weights
         similarity =    5,  2
@@ -275,14 +351,14 @@ class Drum_Player(Player):
         metric_preferences, metric_weights = zip(*metrics)
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
     """
-    Make a variation on a given base pattern
+    Preference profile of a minor variation
     """
-    def minor_variation(self):
+    def minor_profile(self):
         
         # Set metric preferences & weights
         similarity =    2,  2
@@ -303,14 +379,14 @@ class Drum_Player(Player):
         metric_preferences, metric_weights = zip(*metrics)
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
     """
-    Make a variation on a given base pattern
+    Preference profile of a major variation
     """
-    def major_variation(self):
+    def major_profile(self):
         
         # Set metric preferences & weights
         similarity =    5,  2
@@ -331,15 +407,14 @@ class Drum_Player(Player):
         metric_preferences, metric_weights = zip(*metrics)
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
     """
-    Apply variation on a whole section, only making minor changes,
-    to keep things both fresh and familiar
+    Preference profile of a section variation
     """
-    def section_variation(self):
+    def section_profile(self):
         
         # Set metric preferences & weights
         similarity =    1,  2
@@ -360,14 +435,14 @@ class Drum_Player(Player):
         metric_preferences, metric_weights = zip(*metrics)
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
         
         
         
     """
-    Generates a pattern for the end of a phrase, moving it into the next
+    Preference profile of a sequence that ends a phrase
     """
-    def phrase_end(self):
+    def end_profile(self):
         
         # Set metric preferences & weights
         similarity =    5,  3
@@ -388,7 +463,7 @@ class Drum_Player(Player):
         metric_preferences, metric_weights = zip(*metrics)
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
@@ -435,6 +510,24 @@ class Drum_Player(Player):
     
     """ OVERWRITTEN FUNCTIONS """
     
+    """
+    Import the pattern libraries,
+    and index the pairs of half bar kick and snare patterns by their number of hits
+    """
+    def import_libraries(self):
+        
+        super().import_libraries()
+        
+        kick, kick_off, snare = self.libraries.get('kick'), self.libraries.get('kick (off)'), self.libraries.get('snare')
+        
+        # The first half is always a kick on 1, the second half either one
+        self.pairs = {
+            'kick':         pair_index(kick, kick),
+            'kick (off)':   pair_index(kick, kick_off),
+            'snare':        pair_index(snare, snare)}
+    
+    
+    
     """
     Activate a set of kit pieces through MIDI
     (Overwritten by the drummer)
@@ -463,21 +556,22 @@ class Drum_Player(Player):
     
     
     """
-    Handle the timing condition
+    Handle the timing condition.
+    Waits for the deadline of the current 16th note on the conductor clock
+    (which also adds the swing), so lateness doesn't add up over time.
     """
-    def sync(self, i: int, deliberation_time):
+    def sync(self):
         
-        # Calculate 16th note length based on BPM
-        step = (60 / self.BPM) / 4
+        # Wait for everyone to publish this 16th note
+        self.board.wait(self.tick)
         
-        # Add swing
-        if i % 2 == 0:
-            step -= SWING * step
-        else:
-            step += SWING * step
-            
-        time.sleep(step - deliberation_time)
+        # Wait for the deadline of this 16th note
+        self.clock.wait(self.tick)
+        
+        # Move the published outputs to the front
+        self.board.swap(self.tick)
         
         # Notify other threads to continue
         with self.timing:
+            self.clock.release(self.tick)
             self.timing.notify_all()
\ No newline at end of file
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:57:33 2026
+
+@author: beaun
+"""
+
+import asyncio
+
+from Board import Mailbox
+
+
+
+""" ASYNCIO RUNTIME """
+
+"""
+Let the players improvise in a single thread, as coroutines on one event loop.
+Instead of the drummer, a clock task releases each 16th note.
+This is cooperative scheduling with blocking steps: a player runs until it has to wait,
+its deliberation (and the clock task spinning to the deadline) blocks the loop meanwhile.
+"""
+def play(players, clock, board):
+    asyncio.run(ensemble(players, clock, board))
+
+
+
+"""
+Run the clock task and a coroutine for each player until every player is done
+"""
+async def ensemble(players, clock, board):
+
+    timing = asyncio.Condition()
+
+    # Notified whenever a player moves on (it may have published or sent something)
+    progress = asyncio.Condition()
+    finished = list()
+
+    # Players take turns instead of deliberating at the same time
+    share = 1 / len(players)
+
+    performances = [asyncio.create_task(perform(player, share, clock, timing, progress, finished)) for player in players]
+    conductor = asyncio.create_task(conduct(clock, board, timing, progress, finished, len(players)))
+
+    await asyncio.gather(conductor, *performances)
+
+
+
+"""
+Drive the performance of a player, awaiting whatever it has to wait for
+(the steps in between run without giving the loop back)
+"""
+async def perform(player, share, clock, timing, progress, finished):
+
+    for wait in player.perform(share):
+
+        # Let the others check whether what they wait for is there now
+        async with progress:
+            progress.notify_all()
+
+        # Wait for the message for this 16th note
+        if isinstance(wait, Mailbox):
+            async with progress:
+                await progress.wait_for(lambda: wait.ready(player.tick))
+
+        # Wait for the next 16th note
+        else:
+            async with timing:
+                await timing.wait_for(lambda: clock.tick >= player.tick)
+
+    async with progress:
+        finished.append(player)
+        progress.notify_all()
+
+
+
+"""
+Release the 16th notes one by one, on their deadline and once every player published it
+"""
+async def conduct(clock, board, timing, progress, finished, players):
+
+    tick = 0
+
+    while True:
+
+        # Wait for everyone to publish this 16th note
+        async with progress:
+            await progress.wait_for(lambda: board.complete(tick) or len(finished) == players)
+
+        # Stop when everyone is done
+        if not board.complete(tick):
+            return
+
+        # Sleep until shortly before the deadline, the clock spins for the rest
+        await asyncio.sleep(max(0, clock.remaining(tick) - clock.tolerance))
+        clock.wait(tick)
+
+        # Move the published outputs to the front and release the 16th note
+        board.swap(tick)
+        async with timing:
+            clock.release(tick)
+            timing.notify_all()
+
+        tick += 1
\ No newline at end of file
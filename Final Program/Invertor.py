@@ -5,8 +5,20 @@ Created on Wed Mar 13 15:55:21 2024
 @author: beaun
 """
 
+from functools import lru_cache
 
 
+
+# Number of voice led progressions that are remembered
+SIZE = 4096
+
+# Inversion tables per scale (see inversion_table)
+tables = dict()
+
+
+
+""" GREEDY INVERSIONS """
+
 """
 This function takes 2 chords and applies chord inversions until they are 'optimal' in comparison.
 Optimal means that there is as little distance between the chords as possible.
@@ -130,4 +142,115 @@ def inv_up(c):
         l += 12
     # Add at end
     c.append(l)
-    return c
\ No newline at end of file
+    return c
+
+
+
+""" VOICE LEADING """
+
+"""
+Return all inversions of a chord from an octave below to an octave above it (the chord itself first,
+the others from closest to furthest from it), so each chord can only move within 2 octaves.
+"""
+def inversions(chord):
+
+    # Start an octave below and keep inverting up until an octave above
+    inversion = [note - 12 for note in chord]
+    options = [inversion]
+    for _ in range(2 * len(chord)):
+        inversion = inv_up(inversion)
+        options.append(inversion)
+
+    options.sort(key = lambda option: distance(chord, option))
+
+    return tuple(tuple(option) for option in options)
+
+
+
+"""
+Make the inversion table of a scale (in a given octave) once, and return its key. For each kind of chord it holds:
+    (kind, nr):         the inversions of the nth triad / seventh chord
+    (kind, nr1, nr2):   the distance from each inversion of one chord to each inversion of the other
+                        (a row per inversion of the second chord)
+"""
+def inversion_table(scale, octave):
+
+    key = (scale.root, tuple(scale.interval), octave)
+
+    if key not in tables:
+
+        table = dict()
+        chords = range(1, scale.size() + 1)
+
+        for kind, make in [('triad', scale.triad), ('seventh', scale.seventh)]:
+            for nr in chords:
+                table[(kind, nr)] = inversions(make(nr, octave))
+            for nr1 in chords:
+                for nr2 in chords:
+                    table[(kind, nr1, nr2)] = [[distance(previous, chord) for previous in table.get((kind, nr1))] for chord in table.get((kind, nr2))]
+
+        tables[key] = table
+
+    return key
+
+
+
+"""
+Turn a progression (chord positions in the scale) into chords, inverted so the total movement
+(the summed distance between each chord and the next) is as small as possible.
+The first chord is kept as it is, the others can be inverted up to an octave up or down.
+"""
+def lead_voices(scale, progression, octave = 0, kind = 'triad'):
+
+    key = inversion_table(scale, octave)
+
+    return [list(chord) for chord in voice_path(key, tuple(progression), kind)]
+
+
+
+"""
+Find the inversions with the least total movement for a progression (as a tuple), using dynamic programming:
+for each chord it keeps the cheapest way to reach each of its inversions, and where that way came from.
+(The result is remembered per scale, progression and kind of chord)
+"""
+@lru_cache(maxsize = SIZE)
+def voice_path(key, progression, kind):
+
+    table = tables.get(key)
+
+    # Repeated chords stay the same, so only the changes are led
+    changes = [i for i in range(len(progression)) if i == 0 or progression[i] != progression[i - 1]]
+    chords = [progression[i] for i in changes]
+    options = [table.get((kind, nr)) for nr in chords]
+
+    if len(options) == 0:
+        return tuple()
+
+    # The first chord is not inverted
+    costs = [0] + [float('inf')] * (len(options[0]) - 1)
+    origins = list()
+    positions = range(len(costs))
+
+    for nr1, nr2 in zip(chords, chords[1:]):
+
+        # Cheapest way to reach each inversion of the current chord
+        best = [min(zip(map(sum, zip(costs, distances)), positions)) for distances in table.get((kind, nr1, nr2))]
+
+        costs = [cost for cost, _ in best]
+        origins.append([i for _, i in best])
+
+    # Walk back from the cheapest last chord
+    i = min(range(len(costs)), key = costs.__getitem__)
+    path = [options[-1][i]]
+    for step, previous in zip(reversed(origins), reversed(options[:-1])):
+        i = step[i]
+        path.append(previous[i])
+    path.reverse()
+
+    # Repeat the chords again
+    led = list()
+    for j, start in enumerate(changes):
+        end = changes[j + 1] if j + 1 < len(changes) else len(progression)
+        led.extend([path[j]] * (end - start))
+
+    return tuple(led)
\ No newline at end of file
@@ -9,6 +9,11 @@ from Chord_Player import Chord_Player
 from Melody_Player import Melody_Player
 from Drum_Player import Drum_Player
 from Bass_Player import Bass_Player
+from Board import Board, Mailbox
+from Clock import Clock
+from Search_Pool import Search_Pool
+from Budget import Budget_Controller
+import Ensemble
 import time
 import threading
 import mido
@@ -18,6 +23,15 @@ import mido
 # To quickly turn on / off playing during testing
 play = True
 
+# Run each player in its own thread ('threads') or all of them on one event loop ('asyncio')
+runtime = 'threads'
+
+# Number of worker processes that search candidates for each player (0 searches in the player itself)
+workers = 0
+
+# Divide the time of each 16th note over the players based on their needs (instead of a fixed time)
+adaptive = False
+
 # Set scale, BPM and nr of phrases played
 root = 'A'
 mode = 'Minor'
@@ -29,12 +43,12 @@ print("Phrases:\t{:d}".format(phrases))
 
 # Create thread guides
 timing = threading.Condition()
-barrier = threading.Barrier(4)
-lock = threading.Lock()
-guides = (timing, barrier, lock)
+board = Board(4)
+clock = Clock(BPM)
+guides = (timing, board, clock)
 
-# Create output log
-output = dict()
+# Worker pools (created with the players)
+pools = list()
 
 # The try statement is here so that the the MIDI port is always closed once it's created
 try:
@@ -46,20 +60,29 @@ try:
     
     # Create player threads
     print("\nCreating players")
-    bass = Bass_Player(root, mode, phrases, BPM, output, guides, port, channel = 1)
-    chords = Chord_Player(root, mode, phrases, BPM, output, guides, port, channel = 2)
-    melody = Melody_Player(root, mode, phrases, BPM, output, guides, port, channel = 3)
-    drums = Drum_Player(root, mode, phrases, BPM, output, guides, port, channel = 4)
+    bass = Bass_Player(root, mode, phrases, BPM, guides, port, channel = 1)
+    chords = Chord_Player(root, mode, phrases, BPM, guides, port, channel = 2)
+    melody = Melody_Player(root, mode, phrases, BPM, guides, port, channel = 3)
+    drums = Drum_Player(root, mode, phrases, BPM, guides, port, channel = 4)
     players = [bass, chords, melody, drums]
     
     # This allows for a (temporary) communication channel between the bass & chord player
-    bass_output = threading.Barrier(2)
+    bass_output = Mailbox()
     chords.bass_output = bass_output
     bass.bass_output = bass_output
     
-    # Add players to output
-    for player in players:
-        output[player.get_ID()] = None
+    # Create deliberation budget controller
+    controller = None
+    if adaptive:
+        controller = Budget_Controller(clock, players)
+        for player in players:
+            player.controller = controller
+        
+    # Create worker pools (the bass only follows the chords)
+    if workers > 0:
+        for player in [chords, melody, drums]:
+            player.pool = Search_Pool(player, workers)
+            pools.append(player.pool)
      
     if play:
 
@@ -68,13 +91,42 @@ try:
         
         # Start the players
         print("\nStarting players")
-        for player in players:
-            player.start()
+        clock.start()
+        
+        if runtime == 'asyncio':
+            
+            # Play until the players are finished
+            Ensemble.play(players, clock, board)
+            
+        else:
+            
+            for player in players:
+                player.start()
+            
+            # Wait for the players to finish
+            print("\nWaiting for players to finish")
+            for player in players:
+                player.join()
+            
+        # Show how well the band kept the tempo
+        report = clock.report()
+        print("\nTicks:\t\t{:d}".format(report['ticks']))
+        print("Mean lateness:\t{:.2f} ms".format(report['mean'] * 1000))
+        print("Max lateness:\t{:.2f} ms".format(report['max'] * 1000))
+        print("Late ticks:\t{:d}".format(report['late']))
+        print("Drift:\t\t{:.2f} ms".format(report['drift'] * 1000))
         
-        # Wait for the players to finish
-        print("\nWaiting for players to finish")
+        # Show how the deliberation time was divided
+        if controller is not None:
+            print("\nPlayer\tBudget\t\tCandidates\tYield")
+            for ID, metrics in controller.report().items():
+                print("{:s}\t{:.2f} ms\t{:.1f}\t\t{:.0f} /s".format(ID, metrics['budget'] * 1000, metrics['candidates'], metrics['yield']))
+        
+        # Show how often scores came from the cache
+        print("\nPlayer\tCache hits")
         for player in players:
-            player.join()
+            report = player.score_cache.report()
+            print("{:s}\t{:.0f}% of {:d}".format(player.ID, report['rate'] * 100, report['hits'] + report['misses']))
 
 # Print error
 except Exception as e:
@@ -83,4 +135,8 @@ except Exception as e:
 # Close the port
 finally:
     print("\nClosing port")
-    port.close()
\ No newline at end of file
+    port.close()
+    
+    # Stop the workers
+    for pool in pools:
+        pool.close()
\ No newline at end of file
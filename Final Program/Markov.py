@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 07:41:26 2026
+
+@author: beaun
+"""
+
+import os
+import random
+import bisect
+import itertools
+import threading
+import numpy as np
+
+
+
+# Number of previous values the next value of a pattern depends on
+ORDER = 2
+
+# Value that stands for the start & end of a pattern (patterns are made of positive numbers)
+END = 0
+
+# Models that are loaded already (shared by all players)
+loaded = dict()
+lock = threading.Lock()
+
+
+
+""" COUNTING """
+
+"""
+Return the number a context (the values before the next one) is stored under,
+contexts of different lengths never share a number
+"""
+def context_key(context, base):
+
+    key = len(context)
+    for value in context:
+        key = key * base + value
+
+    return key
+
+
+
+"""
+Counts the n-grams of a collection of patterns (i.e. the abstract progressions or rhythm cells of a corpus):
+how often each value follows each context of the last 0 to [order] values (before its start a pattern is all END),
+and how often each sum occurs (the number of 16th notes of a rhythm).
+"""
+class Ngram_Counter:
+
+    """
+    Constructor
+    """
+    def __init__(self, order = ORDER):
+
+        self.order = order
+
+        # {context: {value: count}} & {sum: count}
+        self.transitions = dict()
+        self.totals = dict()
+
+
+
+    """
+    Count a pattern (a number of times)
+    """
+    def add(self, pattern, count = 1):
+
+        padded = [END] * self.order + list(pattern) + [END]
+
+        for i in range(self.order, len(padded)):
+            for n in range(self.order + 1):
+
+                following = self.transitions.setdefault(tuple(padded[i - n:i]), dict())
+                following[padded[i]] = following.get(padded[i], 0) + count
+
+        self.totals[sum(pattern)] = self.totals.get(sum(pattern), 0) + count
+
+
+
+    """
+    Return the counts as arrays: the contexts (see context_key, sorted), where the values that follow each one start,
+    those values & how often they follow it, and the sums with how often they occur
+    """
+    def arrays(self):
+
+        base = max([value for following in self.transitions.values() for value in following], default = END) + 1
+        contexts = sorted(self.transitions.keys(), key = lambda context: context_key(context, base))
+
+        values, counts, starts = list(), list(), [0]
+        for context in contexts:
+            following = sorted(self.transitions.get(context).items())
+            values.extend([value for value, _ in following])
+            counts.extend([count for _, count in following])
+            starts.append(len(values))
+
+        totals = sorted(self.totals.items())
+
+        return {
+            'order':        np.array(self.order, dtype = np.int64),
+            'base':         np.array(base, dtype = np.int64),
+            'contexts':     np.array([context_key(context, base) for context in contexts], dtype = np.int64),
+            'starts':       np.array(starts, dtype = np.int64),
+            'values':       np.array(values, dtype = np.int64),
+            'counts':       np.array(counts, dtype = np.int64),
+            'totals':       np.array([total for total, _ in totals], dtype = np.int64),
+            'frequencies':  np.array([count for _, count in totals], dtype = np.int64)}
+
+
+
+    """
+    Write the counts to a file (as numpy arrays, see arrays)
+    """
+    def save(self, path):
+        np.savez(path, **self.arrays())
+
+
+
+""" MODEL """
+
+"""
+Return the model of a file (written by an Ngram_Counter), every caller gets the same instance.
+When there is no such file, the patterns of the library are counted instead.
+"""
+def markov_model(path, library = None):
+
+    with lock:
+
+        if (path, getattr(library, 'key', None)) not in loaded:
+
+            if os.path.exists(path):
+                with np.load(path) as arrays:
+                    model = Markov_Model(path, library, arrays)
+
+            else:
+                counter = Ngram_Counter()
+                for pattern in library:
+                    counter.add(pattern)
+                model = Markov_Model(path, library, counter.arrays())
+
+            loaded[(path, getattr(library, 'key', None))] = model
+
+        return loaded.get((path, getattr(library, 'key', None)))
+
+
+
+"""
+Forget the models counted from a library that was replaced (by the key of the library)
+"""
+def forget(key):
+
+    with lock:
+
+        for old in [old for old in loaded if old[1] == key]:
+            loaded.pop(old)
+
+
+
+"""
+Markov model of patterns (n-gram transition tables, see Ngram_Counter).
+A pattern is drawn one value at a time, each given the values before it.
+When the longest context was never seen, or nothing that follows it fits, the next shorter one is used.
+Drawing a pattern takes time linear in its length.
+"""
+class Markov_Model:
+
+    """
+    Constructor
+    """
+    def __init__(self, path, library, arrays):
+
+        self.path = path
+        self.library = library
+
+        self.order = int(arrays['order'])
+        self.base = int(arrays['base'])
+
+        # The values that follow each context (in order, so END comes first) and their cumulative counts
+        # (kept as plain numbers, they are read one at a time)
+        starts, values, counts = arrays['starts'].tolist(), arrays['values'].tolist(), arrays['counts'].tolist()
+        self.transitions = dict()
+        for i, key in enumerate(arrays['contexts'].tolist()):
+            self.transitions[key] = values[starts[i]:starts[i + 1]], list(itertools.accumulate(counts[starts[i]:starts[i + 1]]))
+
+        # Sums of the patterns and how often they occur
+        self.totals = arrays['totals'].tolist()
+        self.frequencies = arrays['frequencies'].tolist()
+
+
+
+    """
+    Find the values that can follow a context, from the longest part of it where any value fits:
+    END (if the pattern can end) or a value up to a limit.
+    Returns the values & cumulative counts that follow that part and where the ones that fit start and end
+    (None if nothing fits at all)
+    """
+    def fitting(self, context, end, limit):
+
+        for n in range(self.order, -1, -1):
+
+            following = self.transitions.get(context_key(context[len(context) - n:], self.base))
+            if following is None:
+                continue
+
+            # The values that fit are next to each other
+            values, cumulative = following
+            first = 1 if values[0] == END and not end else 0
+            last = bisect.bisect_right(values, limit)
+            if last > first:
+                return values, cumulative, first, last
+
+        return None
+
+
+
+    """
+    Draw the value that follows a context (see fitting, None if nothing fits at all)
+    """
+    def draw(self, context, end, limit):
+
+        fitting = self.fitting(context, end, limit)
+        if fitting is None:
+            return None
+
+        # Draw one of them (by how often it follows the context)
+        values, cumulative, first, last = fitting
+        low = cumulative[first - 1] if first > 0 else 0
+        return values[bisect.bisect_right(cumulative, random.randrange(low, cumulative[last - 1]), first, last)]
+
+
+
+    """
+    Return whether the next value of a pattern of some length can be END,
+    and the highest value it can be (keeping enough room for the values that are still needed, each is at least 1)
+    """
+    def limits(self, length, minimum, maximum, remaining):
+
+        # The pattern can only end when it is long enough and complete
+        end = length >= minimum and (remaining is None or remaining == 0)
+
+        if maximum is not None and length >= maximum:
+            limit = END
+        elif remaining is not None:
+            limit = remaining - max(0, minimum - length - 1)
+        else:
+            limit = self.base
+
+        return end, limit
+
+
+
+    """
+    Draw a pattern with at least [minimum] and at most [maximum] values (no limit if it is None)
+    that sums to [total] (any sum if it is None). Returns None if the model can't finish it.
+    """
+    def generate(self, minimum = 1, maximum = None, total = None):
+
+        pattern = list()
+        context = [END] * self.order
+        remaining = total
+
+        while True:
+
+            end, limit = self.limits(len(pattern), minimum, maximum, remaining)
+
+            value = self.draw(context, end, limit)
+
+            if value is None:
+                return None
+
+            if value == END:
+                return pattern
+
+            pattern.append(value)
+            context = context[1:] + [value]
+            if remaining is not None:
+                remaining -= value
+
+
+
+    """
+    Draw a progression with at least [minimum] and at most [maximum] chords / notes
+    """
+    def progression(self, minimum = 1, maximum = None):
+        return self.generate(minimum, maximum)
+
+
+
+    """
+    Draw a rhythm with at least [minimum] chords / notes, that is as long as the patterns it was counted from
+    """
+    def rhythm(self, minimum = 1):
+
+        if len(self.totals) == 0:
+            return None
+
+        total = random.choices(self.totals, weights = self.frequencies)[0]
+
+        return self.generate(minimum, total = total)
+
+
+
+    """
+    Check whether the model can never draw a rhythm (or progression) with these limits: nothing fits at the start
+    (for any sum of a rhythm). Unlike a pattern that runs into a dead end halfway, this doesn't depend on chance.
+    """
+    def dead_end(self, minimum = 1, maximum = None, rhythm = False):
+
+        # More values than allowed are needed
+        if maximum is not None and minimum > maximum:
+            return True
+
+        totals = self.totals if rhythm else [None]
+        start = [END] * self.order
+
+        return all([self.fitting(start, *self.limits(0, minimum, maximum, total)) is None for total in totals])
+
+
+
+    """
+    Worker processes load the model themselves instead of receiving a copy
+    """
+    def __reduce__(self):
+        return markov_model, (self.path, self.library)
\ No newline at end of file
@@ -5,19 +5,26 @@ Created on Thu Apr  4 12:56:14 2024
 @author: beaun
 """
 
+import os
 import random
 from Random_Configuration import set_seed
 set_seed()
 
 from Player import Player
+from Pattern_Library import length_index
+from Markov import markov_model
 
-from Combiner import combine
+from Combiner import combine, fill, precompute
 
 from Variations import turn_around, relative_variation, relative_progression
 from Variations import split_rhythm, join_rhythm, shift_rhythm
 
-from Metrics import levenshtein_distance, pairwise_difference
+from Metrics import levenshtein_distance, pairwise_difference, Pairwise_Difference
 from Metrics import rhythm_grid, progression_grid, fingerprint
+from Metrics import pitch_mask, pack, rhythm_grids, progression_grids, batch_levenshtein, batch_pairwise_difference
+
+import numpy as np
+import itertools
 
 
 
@@ -33,6 +40,12 @@ class Melody_Player(Player):
         'rhythms':      "Patterns/Melody/rhythms.txt"
         }
     
+    # N-gram models of the corpus the libraries were extracted from (see Markov)
+    models = {
+        'progressions': "Patterns/Chords/progressions (extraction) model.npz",
+        'rhythms':      "Patterns/Melody/rhythms (extraction) model.npz"
+        }
+    
     general_preference = (2, 2, 3, 3, 5)
             
       
@@ -107,19 +120,18 @@ class Melody_Player(Player):
         
         # Unpack sequence
         progression, _ = sequence
+        
+        # Propose a rhythm that is likely in the corpus
+        rhythm = self.propose('rhythms', len(progression))
+        if rhythm is not None:
+            return rhythm
             
-        # Get a random rhythm that is bigger than the progression
-        rhythm = random.choice(self.libraries.get('rhythms'))
-        tries = 1
-        while len(rhythm) < len(progression):
-            rhythm = random.choice(self.libraries.get('rhythms'))
-            tries += 1
-            
-            # If it takes too long, return the original
-            if tries > 10:
-                return sequence[1]
+        # If no rhythm is big enough, return the original
+        if self.lengths.get('rhythms').count(len(progression)) == 0:
+            return sequence[1]
             
-        return rhythm
+        # Get a random rhythm that is bigger than the progression
+        return self.lengths.get('rhythms').at_least(len(progression))
     
     
     
@@ -130,19 +142,18 @@ class Melody_Player(Player):
         
         # Unpack sequence
         _, rhythm = sequence
+        
+        # Propose a progression that is likely in the corpus
+        progression = self.propose('progressions', 1, len(rhythm))
+        if progression is not None:
+            return progression
             
-        # Get a random rhythm that is bigger than the progression
-        progression = random.choice(self.libraries.get('progressions'))
-        tries = 1
-        while len(progression) > len(rhythm):
-            rhythm = random.choice(self.libraries.get('progressions'))
-            tries += 1
-            
-            # If it takes too long, return the original
-            if tries > 10:
-                return sequence[0]
+        # If no progression is small enough, return the original
+        if self.lengths.get('progressions').count(0, len(rhythm)) == 0:
+            return sequence[0]
             
-        return progression
+        # Get a random progression that is smaller than the rhythm
+        return self.lengths.get('progressions').at_most(len(rhythm))
     
     
     
@@ -151,19 +162,18 @@ class Melody_Player(Player):
     """
     def random_sequence(self):
         
-        # Get a random rhythm & progression
-        progression = random.choice(self.libraries.get('progressions'))
-        rhythm = random.choice(self.libraries.get('rhythms'))
+        progressions, rhythms = self.lengths.get('progressions'), self.lengths.get('rhythms')
+        
+        # Propose a rhythm that is likely in the corpus, or get a random rhythm that fits at least one progression
+        rhythm = self.propose('rhythms', progressions.minimum)
+        if rhythm is None:
+            rhythm = rhythms.at_least(progressions.minimum)
         
-        # Assure the rhythm sequence contains more notes than the progression
-        # If it takes more than 5 tries, get another rhythm
-        tries = 1
-        while len(progression) > len(rhythm):
-            tries += 1
-            progression = random.choice(self.libraries.get('progressions'))
-            if tries > 5:
-                rhythm = random.choice(self.libraries.get('rhythms'))
-                tries = 1
+        # Propose a progression that is likely in the corpus, or get a random progression,
+        # that contains no more notes than the rhythm
+        progression = self.propose('progressions', 1, len(rhythm))
+        if progression is None:
+            progression = progressions.at_most(len(rhythm))
         
         return progression, rhythm
             
@@ -248,6 +258,61 @@ class Melody_Player(Player):
                 differences += 1
                 
         return differences
+    
+    
+    
+    """
+    Resolution (see resolution) of each progression in a block
+    """
+    def batch_resolution(self, output, progressions):
+        
+        # Before the first 75% of a sequence you can't reasonably say much about the resolution
+        if sum([length for _, length in output]) < 12:
+            return np.zeros(len(progressions), dtype = np.int64)
+        
+        # Get the fingerprint of the first and last set of output notes
+        f1, l1 = pitch_mask(output[0][0]), pitch_mask(output[-1][0])
+        
+        # Get the pitch class of the first and last note of each progression
+        f2 = np.array([self.scale.note(progression[0]) % 12 for progression in progressions], dtype = np.int64)
+        l2 = np.array([self.scale.note(progression[-1]) % 12 for progression in progressions], dtype = np.int64)
+        
+        # Whether the first note is in the first chord and the last note is in the last chord
+        first = (f1 >> f2) & 1
+        last = (l1 >> l2) & 1
+        
+        return np.where(last & first, 5, np.where(last, 3, 0))
+    
+    
+    
+    """
+    Challenge (see challenge) of each sequence in a block
+    (the notes come from the combinations made ahead of time, and are turned into pitch classes all at once)
+    """
+    def batch_challenge(self, output, sequences):
+        
+        # Fingerprint of the chord at each step
+        masks = [pitch_mask(notes) for notes, length in output for _ in range(abs(length))]
+        
+        # Pitch class of each note in the scale (as it is played, see convert)
+        classes = np.array([0] + [self.scale.note(nr, 1) % 12 for nr in range(1, self.scale.size() + 1)], dtype = np.int64)
+        
+        # Note of each length in the rhythms
+        rhythms = [rhythm for _, rhythm in sequences]
+        combined = [fill(tuple(progression), tuple(rhythm)) for progression, rhythm in sequences]
+        notes = np.fromiter(itertools.chain.from_iterable(combined), dtype = np.int64, count = sum([len(rhythm) for rhythm in rhythms]))
+        
+        # Pitch class of the note at each step of each sequence
+        packed, lengths = progression_grids(classes[notes], rhythms)
+        
+        length = min(len(masks), packed.shape[1])
+        masks = np.array(masks[:length], dtype = np.int64)
+        
+        # Count the steps where the note is not in the chord
+        outside = ((masks >> packed[:, :length]) & 1) == 0
+        outside &= np.arange(length) < lengths[:, None]
+        
+        return outside.sum(axis = 1)
             
         
         
@@ -274,6 +339,74 @@ class Melody_Player(Player):
     
     
     
+    """
+    Calculate the scores of a block of sequences given a memory chunk, all at once
+    """
+    def score_batch(self, memory, sequences):
+        
+        progressions = [progression for progression, _ in sequences]
+        rhythms = [rhythm for _, rhythm in sequences]
+        grids, steps = rhythm_grids(rhythms)
+        
+        none = np.zeros(len(sequences), dtype = np.int64)
+        continuity, energy, chords_match, resolution, challenge = none, none, none, none, none
+        
+        # Calculate metrics
+        if self.reflection:
+            p1, r1 = memory.get(self.ID)
+            packed, lengths = pack(progressions)
+            continuity = batch_levenshtein(rhythm_grid(r1), grids, steps) + batch_levenshtein(p1, packed, lengths)
+            energy = np.abs(len(p1) + len(r1) - lengths - np.array([len(rhythm) for rhythm in rhythms]))
+            
+        if self.cooperation:
+            chord_grid = rhythm_grid([length for _, length in memory.get('Chords')])
+            chords_match = batch_pairwise_difference(chord_grid, grids, steps)
+            resolution = self.batch_resolution(memory.get("Chords"), progressions)
+            challenge = self.batch_challenge(memory.get("Chords"), sequences)
+        
+        return list(zip(continuity.tolist(), energy.tolist(), chords_match.tolist(), resolution.tolist(), challenge.tolist()))
+    
+    
+    
+    """
+    Create the scoring state of a sequence.
+    The scores against its own sequence don't change during a sequence,
+    the rhythm overlap and challenge are extended as the chords come in.
+    """
+    def scoring_state(self, memory, sequence):
+        
+        continuity = self.continuity(memory, sequence)                  if self.reflection else 0
+        energy = self.energy_consistency(memory.get(self.ID), sequence) if self.reflection else 0
+        
+        _, rhythm = sequence
+        overlap = Pairwise_Difference(rhythm_grid(rhythm))
+        
+        # A step is challenging if the note is not in the chord
+        challenge = Pairwise_Difference(progression_grid(self.convert(sequence)), lambda chord, note: note not in chord)
+        
+        return sequence, continuity, energy, overlap, challenge
+    
+    
+    
+    """
+    Update a scoring state with the new steps in the memory and return the score
+    """
+    def update_state(self, state, memory):
+        
+        sequence, continuity, energy, overlap, challenge = state
+        
+        if not self.cooperation:
+            return continuity, energy, 0, 0, 0
+        
+        chord_grid = rhythm_grid([length for _, length in memory.get('Chords')])
+        chords_match = overlap.extend(chord_grid)
+        resolution = self.resolution(memory.get("Chords"), sequence)
+        challenge = challenge.extend(progression_grid(memory.get("Chords")))
+        
+        return continuity, energy, chords_match, resolution, challenge
+    
+    
+    
     """
     Generate a random variation given a sequence
     """
@@ -322,28 +455,31 @@ class Melody_Player(Player):
     """
     def start_sequence(self):
         
-        # Get a random rhythm & progression
-        progression = random.choice(self.libraries.get('progressions'))
-        rhythm = random.choice(self.libraries.get('rhythms'))
+        progressions, rhythms = self.lengths.get('progressions'), self.lengths.get('rhythms')
+        
+        # The rhythm needs at least as many notes as the shortest progression of at least 3 notes
+        # (or as the longest progression, if there are none that long)
+        fewest = progressions.shortest(3)
+        
+        # Propose a rhythm that is likely in the corpus, or get a random one, that fits at least one of those progressions
+        rhythm = self.propose('rhythms', fewest)
+        if rhythm is None:
+            rhythm = rhythms.at_least(fewest)
         
-        # Assure the rhythm sequence contains more notes than the progression
-        # If it takes more than 5 tries, get another rhythm
-        tries = 1
-        while len(progression) > len(rhythm) or len(progression) < 3:
-            tries += 1
-            progression = random.choice(self.libraries.get('progressions'))
-            if tries > 5:
-                rhythm = random.choice(self.libraries.get('rhythms'))
-                tries = 1
+        # Propose a progression of at least 3 notes that is likely in the corpus, or get a random one,
+        # that contains no more notes than the rhythm
+        progression = self.propose('progressions', min(3, fewest), len(rhythm))
+        if progression is None:
+            progression = progressions.sample(min(3, fewest), len(rhythm))
         
         return progression, rhythm
     
     
     
     """
-    Choose a sequence for the base of a section
+    Preference profile of a base sequence
     """
-    def base_sequence(self):
+    def base_profile(self):
     
         # Set metric preferences & weights
         continuity =    5,  2
@@ -366,14 +502,14 @@ class Melody_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
     """
-    Make a variation on a given base pattern
+    Preference profile of a minor variation
     """
-    def minor_variation(self):
+    def minor_profile(self):
         
         # Set metric preferences & weights
         continuity =    3,  2
@@ -396,14 +532,14 @@ class Melody_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
     """
-    Make a variation on a given base pattern
+    Preference profile of a major variation
     """
-    def major_variation(self):
+    def major_profile(self):
         
         # Set metric preferences & weights
         continuity =    5,  2
@@ -426,15 +562,14 @@ class Melody_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
     """
-    Apply variation on a whole section, only making minor changes,
-    to keep things both fresh and familiar
+    Preference profile of a section variation
     """
-    def section_variation(self):
+    def section_profile(self):
         
         # Set metric preferences & weights
         continuity =    2,  2
@@ -457,14 +592,14 @@ class Melody_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
         
         
         
     """
-    Generates a pattern for the end of a phrase, moving it into the next
+    Preference profile of a sequence that ends a phrase
     """
-    def phrase_end(self):
+    def end_profile(self):
         
         # Set metric preferences & weights
         continuity =    5,  3
@@ -487,7 +622,7 @@ class Melody_Player(Player):
         metric_preferences, metric_weights = zip(*metrics) if type(metrics[0]) == tuple else metrics
         preferences = metric_preferences, metric_weights, sequence_weights
         
-        return super().select_candidate(preferences)
+        return preferences
     
     
     
@@ -508,4 +643,24 @@ class Melody_Player(Player):
         # Zip contents
         MIDI = list(zip(notes, rhythm))
         
-        return MIDI
\ No newline at end of file
+        return MIDI
+    
+    
+    
+    """ OVERWRITTEN FUNCTIONS """
+    
+    """
+    Import the pattern libraries, index the progressions and rhythms by their number of notes,
+    load the corpus models (if they were extracted)
+    and combine every progression with every rhythm ahead of time
+    """
+    def import_libraries(self):
+        
+        super().import_libraries()
+        
+        self.lengths = {key: length_index(library) for key, library in self.libraries.items()}
+        
+        # (The models only propose patterns once they were extracted from the corpus)
+        self.markov = {key: markov_model(path) for key, path in self.models.items() if os.path.exists(path)}
+        
+        precompute(self.libraries.get('progressions'), self.libraries.get('rhythms'))
\ No newline at end of file
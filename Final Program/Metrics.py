@@ -6,6 +6,16 @@ Created on Wed Jun  5 15:37:08 2024
 """
 
 import math
+import itertools
+import numpy as np
+
+
+
+# Longest pattern (in steps) for the bit-parallel levenshtein distance
+WORD = 64
+
+# Widths (in steps) that batches of sequences are packed into
+WIDTHS = [16, 32, 64]
 
 
 
@@ -34,6 +44,23 @@ def fingerprint(notes):
     
 
 
+"""
+Creates the fingerprint of a set of notes as a number, where each bit stands for a pitch class
+"""
+def pitch_mask(notes):
+    
+    # If it is a single note
+    if type(notes) != list:
+        notes = [notes]
+        
+    mask = 0
+    for note in notes:
+        mask |= 1 << (note % 12)
+        
+    return mask
+
+
+
 """
 Create a grid similar to the drumgrid, but instead with the fingerprint of the progression
 """
@@ -115,10 +142,150 @@ def pairwise_difference(s1, s2):
 
 
 """
-Calculates the difference between 2 sequences using the levenshtein distance algorithm
+Pairwise difference between a fixed sequence and a sequence that grows over time (like the short term memory).
+Each time it is extended, only the new steps are compared.
+(The steps of the growing sequence are the first argument of [differ])
+"""
+class Pairwise_Difference:
+    
+    def __init__(self, sequence, differ = None):
+        self.sequence = sequence
+        self.differ = differ if differ is not None else lambda e1, e2: e1 != e2
+        self.position = 0
+        self.differences = 0
+        
+        
+        
+    """
+    Compare the new steps of the growing sequence, return the number of differing steps so far
+    """
+    def extend(self, growing):
+        
+        # Stop when the shortest sequence is exhausted
+        end = min(len(growing), len(self.sequence))
+        
+        for i in range(self.position, end):
+            if self.differ(growing[i], self.sequence[i]):
+                self.differences += 1
+                
+        self.position = max(self.position, end)
+        
+        return self.differences
+
+
+
+"""
+Calculates the difference between 2 sequences using the levenshtein distance algorithm.
+Uses the bit-parallel algorithm when one of the sequences fits in a word, the full table otherwise.
 """
 def levenshtein_distance(s1, s2):
     
+    # The distance is symmetric, so the shortest sequence can be used as the pattern
+    if len(s2) < len(s1):
+        s1, s2 = s2, s1
+    
+    if len(s1) <= WORD:
+        try:
+            return bit_levenshtein(s1, s2)
+        
+        # Steps that can't be hashed (like chords given as lists)
+        except TypeError:
+            pass
+        
+    return levenshtein_table(s1, s2)
+
+
+
+"""
+Levenshtein distance, but stops once it is certain that the distance is larger than a bound.
+Returns the distance, or [bound + 1] if the distance is larger than the bound.
+"""
+def bounded_levenshtein(s1, s2, bound):
+    
+    if len(s2) < len(s1):
+        s1, s2 = s2, s1
+    
+    # The length difference alone is too much
+    if len(s2) - len(s1) > bound:
+        return bound + 1
+    
+    if len(s1) <= WORD:
+        try:
+            return bit_levenshtein(s1, s2, bound)
+        except TypeError:
+            pass
+        
+    return min(levenshtein_table(s1, s2), bound + 1)
+
+
+
+"""
+Bit-parallel levenshtein distance (Myers / Hyyrö).
+Each bit represents a step of the pattern [s1], a column of the table is computed in a few operations on whole words
+(the vertical differences between the cells of a column are kept as bit vectors: +1 in [positive], -1 in [negative]).
+Optionally stops once the distance must be larger than [bound].
+"""
+def bit_levenshtein(s1, s2, bound = None):
+    
+    m = len(s1)
+    n = len(s2)
+    
+    if m == 0:
+        return n if bound is None else min(n, bound + 1)
+    
+    # For each step value, the positions where it occurs in the pattern
+    matches = dict()
+    for i, step in enumerate(s1):
+        matches[step] = matches.get(step, 0) | (1 << i)
+        
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    
+    # The first column of the table goes up by 1 each step
+    positive = mask
+    negative = 0
+    
+    # Value of the bottom cell of the current column
+    distance = m
+    
+    for j, step in enumerate(s2):
+        
+        match = matches.get(step, 0)
+        
+        # Compute the horizontal differences from the vertical ones
+        vertical = match | negative
+        horizontal = (((match & positive) + positive) ^ positive) | match
+        horizontal_positive = negative | ~(horizontal | positive)
+        horizontal_negative = positive & horizontal
+        
+        # Update the bottom cell
+        if horizontal_positive & last:
+            distance += 1
+        elif horizontal_negative & last:
+            distance -= 1
+            
+        # Compute the new vertical differences (the top row goes up by 1 each step)
+        horizontal_positive = (horizontal_positive << 1) | 1
+        horizontal_negative = horizontal_negative << 1
+        positive = (horizontal_negative | ~(vertical | horizontal_positive)) & mask
+        negative = horizontal_positive & vertical & mask
+        
+        # The remaining steps can lower the distance by at most 1 each
+        if bound is not None and distance - (n - j - 1) > bound:
+            return bound + 1
+        
+    if bound is not None:
+        return min(distance, bound + 1)
+    
+    return distance
+
+
+
+"""
+Calculates the levenshtein distance by filling in the whole table
+"""
+def levenshtein_table(s1, s2):
+    
     # Initialise matrix
     h = len(s1) + 1
     w = len(s2) + 1
@@ -169,4 +336,164 @@ def euclidian_distance(t1, t2, weights = None):
         
         distance += w * (e1 - e2) ** 2 
         
-    return math.sqrt(distance)
\ No newline at end of file
+    return math.sqrt(distance)
+
+
+
+""" BATCH METHODS """
+
+"""
+Return the width to pack sequences of at most [length] steps into
+"""
+def batch_width(length):
+    
+    for width in WIDTHS:
+        if length <= width:
+            return width
+        
+    return length
+
+
+
+"""
+Pack a batch of sequences (of whole numbers) into an array with a row per sequence,
+padded with 0's. Returns the array and the length of each sequence.
+"""
+def pack(sequences):
+    
+    lengths = np.array([len(sequence) for sequence in sequences], dtype = np.int64)
+    packed = np.zeros((len(sequences), batch_width(lengths.max(initial = 0))), dtype = np.int64)
+    
+    for i, sequence in enumerate(sequences):
+        packed[i, :len(sequence)] = sequence
+        
+    return packed, lengths
+
+
+
+"""
+Converts a batch of rhythms to grids of 1 and 0 (see rhythm_grid), packed in an array.
+Returns the array and the length (in steps) of each grid.
+"""
+def rhythm_grids(rhythms):
+    
+    # All lengths after each other, with the rhythm they belong to
+    counts = [len(rhythm) for rhythm in rhythms]
+    flat = np.fromiter(itertools.chain.from_iterable(rhythms), dtype = np.int64, count = sum(counts))
+    rows = np.repeat(np.arange(len(rhythms)), counts)
+    steps = np.abs(flat)
+    
+    # Length of each grid
+    lengths = np.bincount(rows, weights = steps, minlength = len(rhythms)).astype(np.int64)
+    
+    # The step each chord / note starts at, within its own grid
+    offsets = np.cumsum(lengths) - lengths
+    starts = np.cumsum(steps) - steps - offsets[rows]
+    
+    # 'New' chords / notes start with a 1
+    grids = np.zeros((len(rhythms), batch_width(lengths.max(initial = 0))), dtype = np.int64)
+    new = flat > 0
+    grids[rows[new], starts[new]] = 1
+    
+    return grids, lengths
+
+
+
+"""
+Converts a batch of rhythms to grids where each step holds the value of the chord / note playing on it
+(see progression_grid), given those values (one per length in the rhythms, all after each other).
+Returns the packed array and the length (in steps) of each grid.
+"""
+def progression_grids(values, rhythms):
+    
+    # All lengths after each other, with the rhythm they belong to
+    counts = [len(rhythm) for rhythm in rhythms]
+    steps = np.abs(np.fromiter(itertools.chain.from_iterable(rhythms), dtype = np.int64, count = sum(counts)))
+    rows = np.repeat(np.arange(len(rhythms)), counts)
+    
+    # Length of each grid
+    lengths = np.bincount(rows, weights = steps, minlength = len(rhythms)).astype(np.int64)
+    
+    # Every step with the grid it belongs to and its position within that grid
+    offsets = np.cumsum(lengths) - lengths
+    rows = np.repeat(rows, steps)
+    columns = np.arange(len(rows)) - offsets[rows]
+    
+    grids = np.zeros((len(rhythms), batch_width(lengths.max(initial = 0))), dtype = np.int64)
+    grids[rows, columns] = np.repeat(values, steps)
+    
+    return grids, lengths
+
+
+
+"""
+Pairwise difference (see pairwise_difference) of a sequence with each sequence of a packed batch
+"""
+def batch_pairwise_difference(sequence, packed, lengths):
+    
+    length = min(len(sequence), packed.shape[1])
+    sequence = np.array(sequence[:length], dtype = np.int64)
+    
+    # Only count the steps where both sequences have a step
+    differences = packed[:, :length] != sequence
+    differences &= np.arange(length) < lengths[:, None]
+    
+    return differences.sum(axis = 1)
+
+
+
+"""
+Levenshtein distance of a sequence with each sequence of a packed batch.
+Runs the bit-parallel algorithm (see bit_levenshtein) on the whole batch at once,
+with the sequence as the pattern.
+"""
+def batch_levenshtein(sequence, packed, lengths):
+    
+    m = len(sequence)
+    
+    # Empty pattern: the distance is the length of the other sequence
+    if m == 0:
+        return lengths.copy()
+    
+    # Too long for a word
+    if m > WORD:
+        return np.array([levenshtein_distance(sequence, list(row[:length])) for row, length in zip(packed.tolist(), lengths)], dtype = np.int64)
+    
+    # For each step value, the positions where it occurs in the pattern
+    matches = dict()
+    for i, step in enumerate(sequence):
+        matches[step] = matches.get(step, 0) | (1 << i)
+        
+    one = np.uint64(1)
+    mask = np.uint64((1 << m) - 1)
+    last = np.uint64(1 << (m - 1))
+    
+    positive = np.full(len(packed), mask, dtype = np.uint64)
+    negative = np.zeros(len(packed), dtype = np.uint64)
+    distance = np.full(len(packed), m, dtype = np.int64)
+    
+    # Positions in the pattern that match each step of each sequence
+    table = np.zeros(packed.shape, dtype = np.uint64)
+    for step, positions in matches.items():
+        table[packed == step] = positions
+    
+    for j in range(lengths.max(initial = 0)):
+        
+        match = table[:, j]
+        
+        vertical = match | negative
+        horizontal = (((match & positive) + positive) ^ positive) | match
+        horizontal_positive = negative | ~(horizontal | positive)
+        horizontal_negative = positive & horizontal
+        
+        # Update the bottom cell (only for sequences that are this long)
+        active = j < lengths
+        distance += active & ((horizontal_positive & last) != 0)
+        distance -= active & ((horizontal_negative & last) != 0)
+        
+        horizontal_positive = (horizontal_positive << one) | one
+        horizontal_negative = horizontal_negative << one
+        positive = (horizontal_negative | ~(vertical | horizontal_positive)) & mask
+        negative = horizontal_positive & vertical & mask
+        
+    return distance
\ No newline at end of file
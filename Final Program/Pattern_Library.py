@@ -0,0 +1,494 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:22:05 2026
+
+@author: beaun
+"""
+
+import os
+import json
+import hashlib
+import random
+import threading
+import numpy as np
+
+from Metrics import rhythm_grids
+from Markov import forget
+
+
+
+# Folder the compiled libraries are kept in
+BUNDLES = "Patterns/Bundles"
+
+# Version of the bundle layout (bundles of another version are rebuilt)
+VERSION = 1
+
+# Arrays in a bundle
+FEATURES = ['patterns', 'offsets', 'lengths', 'steps', 'energy', 'fingerprints', 'grids']
+
+# Libraries and (pair & length) indices that are loaded already (shared by all players)
+loaded = dict()
+indices = dict()
+
+# Size and time of the last change of each library file when it was loaded, with the key of its library
+versions = dict()
+lock = threading.Lock()
+
+
+
+""" BUNDLES """
+
+"""
+Return the folder of the bundle of a library
+(i.e. Patterns/Chords/progressions.txt is compiled to Patterns/Bundles/Chords/progressions)
+"""
+def bundle_folder(path):
+
+    relative = os.path.relpath(os.path.splitext(path)[0], "Patterns")
+
+    return os.path.join(BUNDLES, relative)
+
+
+
+"""
+Return the hash of the contents of a library file
+"""
+def source_hash(path):
+
+    with open(path, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+
+"""
+Read the patterns of a library file (one pattern of whole numbers per line, empty lines are skipped)
+"""
+def parse(path):
+
+    with open(path, 'r') as file:
+        patterns = file.readlines()
+
+    library = list()
+    for pattern in patterns:
+        pattern = [int(char) for char in pattern.strip().split()]
+        if len(pattern) > 0:
+            library.append(pattern)
+
+    return library
+
+
+
+"""
+Compile a library file into a bundle: the patterns after each other with an index of where each one starts,
+and some features of each pattern:
+    lengths:        number of chords / notes / steps
+    steps:          number of 16th notes (if the pattern is a rhythm)
+    energy:         sum of the pattern (number of hits if it is a drum pattern)
+    fingerprints:   the values that occur in the pattern, as bits (i.e. the chords of a progression)
+    grids:          16th note grid (if the pattern is a rhythm, see rhythm_grid)
+"""
+def build(path):
+
+    library = parse(path)
+    folder = bundle_folder(path)
+    os.makedirs(folder, exist_ok = True)
+
+    lengths = np.array([len(pattern) for pattern in library], dtype = np.int64)
+    grids, steps = rhythm_grids(library)
+
+    features = {
+        'patterns':     np.array([value for pattern in library for value in pattern], dtype = np.int64),
+        'offsets':      np.cumsum(lengths) - lengths,
+        'lengths':      lengths,
+        'steps':        steps,
+        'energy':       np.array([sum(pattern) for pattern in library], dtype = np.int64),
+        'fingerprints': np.array([sum([1 << (value % 64) for value in set(pattern)]) for pattern in library], dtype = np.uint64),
+        'grids':        grids.astype(np.int8)}
+
+    for name, array in features.items():
+        np.save(os.path.join(folder, name + ".npy"), array)
+
+    # The index is written last, so a bundle without one is never used
+    index = {'source': path, 'hash': source_hash(path), 'version': VERSION, 'patterns': len(library)}
+    with open(os.path.join(folder, "index.json"), 'w') as file:
+        json.dump(index, file)
+
+
+
+"""
+Check whether the bundle of a library exists and was compiled from the current version of the file
+(given the hash of the file, if it is known already)
+"""
+def up_to_date(path, digest = None):
+
+    try:
+        with open(os.path.join(bundle_folder(path), "index.json"), 'r') as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        return False
+
+    if digest is None:
+        digest = source_hash(path)
+
+    return index.get('version') == VERSION and index.get('hash') == digest
+
+
+
+"""
+Return the library of a file. Compiles it when the file changed,
+every caller gets the same (read-only) instance as long as the file doesn't change.
+"""
+def load(path):
+
+    with lock:
+
+        # The file is only read again when its size or the time of its last change differ
+        stamp = os.path.getsize(path), os.path.getmtime(path)
+        if path in versions and versions.get(path)[0] == stamp:
+            return loaded.get(versions.get(path)[1])
+
+        # The file as it is now: its path, the hash of its contents (as recorded in the index of the bundle)
+        # and when it was last changed
+        digest = source_hash(path)
+        key = path, digest, stamp[1]
+
+        if key not in loaded:
+
+            if not up_to_date(path, digest):
+                build(path)
+
+            # Forget the library of an older version of the file, and the indices & models made from it
+            # (length indices are kept under the key of their library, pair indices under the keys of both libraries)
+            for old in [old for old in loaded if old[0] == path]:
+                loaded.pop(old)
+                for index in [index for index in indices if index == old or old in index]:
+                    indices.pop(index)
+                forget(old)
+
+            loaded[key] = Library(path, key)
+
+        versions[path] = stamp, key
+
+        return loaded.get(key)
+
+
+
+""" LIBRARY """
+
+"""
+A compiled library of patterns. The arrays are memory mapped from the bundle, so they are only read when used
+and shared with every player (and every worker process) that loads the same library.
+It behaves like a list of patterns: each pattern is returned as a new list, so it can be changed freely.
+"""
+class Library:
+
+    """
+    Constructor
+    """
+    def __init__(self, path, key = None):
+
+        self.path = path
+        self.key = key
+        folder = bundle_folder(path)
+
+        for name in FEATURES:
+            setattr(self, name, np.load(os.path.join(folder, name + ".npy"), mmap_mode = 'r'))
+
+        # Where each pattern starts and how long it is, as plain numbers (indexing memory mapped arrays is slow),
+        # and a plain view of the patterns (still memory mapped, but sliced without the memmap overhead)
+        self.starts = self.offsets.tolist()
+        self.sizes = self.lengths.tolist()
+        self.values = self.patterns.view(np.ndarray)
+
+
+
+    """
+    Return the number of patterns
+    """
+    def __len__(self):
+        return len(self.sizes)
+
+
+
+    """
+    Return the ith pattern
+    """
+    def __getitem__(self, i):
+
+        if i < 0:
+            i += len(self)
+
+        if i < 0 or i >= len(self):
+            raise IndexError("There are only {:d} patterns in {:s}".format(len(self), self.path))
+
+        start = self.starts[i]
+        return self.values[start:start + self.sizes[i]].tolist()
+
+
+
+    """
+    Loop over the patterns
+    """
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+
+    """
+    Worker processes load the library themselves instead of receiving a copy
+    """
+    def __reduce__(self):
+        return load, (self.path,)
+
+
+
+""" PAIR INDEX """
+
+"""
+Return the index of the pairs of two libraries (every caller gets the same instance)
+"""
+def pair_index(first, second):
+
+    with lock:
+
+        if (first.key, second.key) not in indices:
+            indices[(first.key, second.key)] = Pair_Index(first, second)
+
+        return indices.get((first.key, second.key))
+
+
+
+"""
+Index of every pair of patterns (the first from one library, the second from another),
+grouped by their total energy (the number of hits for drum patterns).
+A random pair with an energy between n and m is drawn in constant time, uniformly over all pairs that fit.
+"""
+class Pair_Index:
+
+    """
+    Constructor
+    """
+    def __init__(self, first, second):
+
+        self.first = first
+        self.second = second
+
+        # Energy of every pair (a row per pattern of the first library)
+        energy = np.asarray(first.energy)[:, None] + np.asarray(second.energy)[None, :]
+
+        # The pairs (as i * size of the second library + j), sorted by energy
+        pairs = np.argsort(energy, axis = None, kind = 'stable')
+        energy = energy.ravel()[pairs]
+
+        # Where the pairs with each energy start (energies beyond the maximum start at the end)
+        self.maximum = int(energy.max(initial = 0))
+        starts = np.searchsorted(energy, np.arange(self.maximum + 2))
+
+        # (Kept as plain numbers, they are read one at a time)
+        self.pairs = pairs.tolist()
+        self.starts = starts.tolist()
+
+        # The patterns of both libraries as plain lists (reading them from the bundle each draw is slower)
+        self.firsts = list(first)
+        self.seconds = list(second)
+
+        # Range of positions for each energy range that was asked for before
+        self.ranges = dict()
+
+
+
+    """
+    Return the range of positions of the pairs with an energy between n and m (remembered for each range)
+    """
+    def bounds(self, n, m):
+
+        bounds = self.ranges.get((n, m))
+        if bounds is not None:
+            return bounds
+
+        low = min(max(n, 0), self.maximum + 1)
+        high = min(max(m, -1), self.maximum)
+
+        # No energy fits
+        bounds = (0, 0) if high < low else (self.starts[low], self.starts[high + 1])
+
+        return self.ranges.setdefault((n, m), bounds)
+
+
+
+    """
+    Return the number of pairs with an energy between n and m
+    """
+    def count(self, n, m):
+
+        start, end = self.bounds(n, m)
+
+        return end - start
+
+
+
+    """
+    Return a random pair of patterns with an energy between n and m (None if there are none)
+    """
+    def draw(self, n, m):
+
+        start, end = self.bounds(n, m)
+
+        if end <= start:
+            return None
+
+        i, j = divmod(self.pairs[start + int(random.random() * (end - start))], len(self.seconds))
+
+        return list(self.firsts[i]), list(self.seconds[j])
+
+
+
+    """
+    Return a random pair of patterns with an energy between n and m
+    """
+    def sample(self, n, m):
+
+        pair = self.draw(n, m)
+
+        if pair is None:
+            raise ValueError("There are no pairs of {:s} and {:s} with {:d} to {:d} hits".format(self.first.path, self.second.path, n, m))
+
+        return pair
+
+
+
+    """
+    Worker processes build the index themselves instead of receiving a copy
+    """
+    def __reduce__(self):
+        return pair_index, (self.first, self.second)
+
+
+
+""" LENGTH INDEX """
+
+"""
+Return the index of the lengths of a library (every caller gets the same instance)
+"""
+def length_index(library):
+
+    with lock:
+
+        if library.key not in indices:
+            indices[library.key] = Length_Index(library)
+
+        return indices.get(library.key)
+
+
+
+"""
+Index of the patterns of a library by their length (number of chords / notes).
+A random pattern with a length between n and m is drawn in constant time, uniformly over all patterns that fit.
+"""
+class Length_Index:
+
+    """
+    Constructor
+    """
+    def __init__(self, library):
+
+        self.library = library
+
+        # The patterns, sorted by length
+        lengths = np.asarray(library.lengths)
+        order = np.argsort(lengths, kind = 'stable')
+        lengths = lengths[order]
+
+        # Shortest & longest pattern
+        self.minimum = int(lengths[0]) if len(lengths) > 0 else 0
+        self.maximum = int(lengths[-1]) if len(lengths) > 0 else 0
+
+        # Where the patterns of each length start (lengths beyond the maximum start at the end)
+        starts = np.searchsorted(lengths, np.arange(self.maximum + 2))
+
+        # (Kept as plain numbers, they are read one at a time)
+        self.order = order.tolist()
+        self.starts = starts.tolist()
+
+
+
+    """
+    Return the range of positions of the patterns with a length between n and m (no upper limit if m is None)
+    """
+    def bounds(self, n = 0, m = None):
+
+        if m is None:
+            m = self.maximum
+
+        n = min(max(n, 0), self.maximum + 1)
+        m = min(max(m, -1), self.maximum)
+
+        # No length fits
+        if m < n:
+            return 0, 0
+
+        return self.starts[n], self.starts[m + 1]
+
+
+
+    """
+    Return the number of patterns with a length between n and m
+    """
+    def count(self, n = 0, m = None):
+
+        start, end = self.bounds(n, m)
+
+        return end - start
+
+
+
+    """
+    Return a random pattern with a length between n and m (no upper limit if m is None)
+    """
+    def sample(self, n = 0, m = None):
+
+        start, end = self.bounds(n, m)
+
+        if end <= start:
+            raise ValueError("There are no patterns in {:s} with {:d} to {:s} values".format(self.library.path, n, str(m)))
+
+        return self.library[self.order[random.randrange(start, end)]]
+
+
+
+    """
+    Return the length of the shortest pattern with at least n values (the length of the longest pattern if there are none)
+    """
+    def shortest(self, n):
+
+        start, end = self.bounds(n)
+
+        if end <= start:
+            return self.maximum
+
+        return self.library.sizes[self.order[start]]
+
+
+
+    """
+    Return a random pattern with at most k values
+    """
+    def at_most(self, k):
+        return self.sample(0, k)
+
+
+
+    """
+    Return a random pattern with at least k values
+    """
+    def at_least(self, k):
+        return self.sample(k)
+
+
+
+    """
+    Worker processes build the index themselves instead of receiving a copy
+    """
+    def __reduce__(self):
+        return length_index, (self.library,)
\ No newline at end of file
@@ -11,12 +11,19 @@ import mido
 import time
 
 from Scale import Scale
+from Board import Mailbox
+from Candidate_Store import Candidate_Store, freeze
+from Score_Cache import Score_Cache
+from Pattern_Library import load
 
 from Metrics import euclidian_distance
 
 # Set phrase length
 SECTIONS = 2
 
+# Number of candidates that are created and scored together
+BLOCK = 64
+
 
 
 """
@@ -31,17 +38,40 @@ class Player(threading.Thread):
     libraries: dict
     
     # These variables are used to save and evaluate candidates
-    candidates: dict
+    candidates: Candidate_Store
     general_preference: tuple
     
+    # Incremental scoring state of the candidates that are re-evaluated
+    rescoring: dict
+    
     # These variables are used to reconstruct and store the history of players
     long_memory: list
     short_memory: dict
     
+    # Version of the short memory (changes whenever it does) and the versions of the long memory chunks
+    memory_version: int
+    long_versions: list
+    
     # These variables are used to control the amount of cooperation and self reflection
     reflection = True
     cooperation = False
     
+    # Number of candidates to consider each 16th note instead of a fixed time (used when rendering offline)
+    candidate_budget = None
+    
+    # Pool of worker processes to create and score candidates in (optional)
+    pool = None
+    
+    # Adaptive deliberation budget (optional), and the number of candidates per 16th note that are still useful
+    controller = None
+    candidate_target = 100
+    
+    # N-gram models of the corpus that propose patterns (see Markov), only there once they were extracted
+    markov = dict()
+    
+    # The 16th note and the limits the models can't propose a pattern for at all (checked once during it)
+    dead_ends = (None, frozenset())
+    
     
     
     """ INITIALISATION """
@@ -49,17 +79,16 @@ class Player(threading.Thread):
     """
     Constructor
     """
-    def __init__(self, root, mode, phrases, BPM, output, guides, port, channel):
+    def __init__(self, root, mode, phrases, BPM, guides, port, channel):
         super().__init__()
         
         # Set initial variables
         self.scale = Scale(root, mode)
         self.phrases = phrases
         self.BPM = BPM
-        self.output = output
         self.timing = guides[0]
-        self.barrier = guides[1]
-        self.lock = guides[2]
+        self.board = guides[1]
+        self.clock = guides[2]
         self.port = port
         self.channel = channel - 1
         
@@ -67,44 +96,41 @@ class Player(threading.Thread):
         self.import_libraries()
         
         # Initialise memories
+        self.memory_version = 0
         self.long_memory = list()
+        self.long_versions = list()
         self.reset_memory()
         
+        # Cache for the scores of candidates against memory chunks
+        self.score_cache = Score_Cache()
+        
         # Calculate deliberation time based on BPM
         self.deliberation_time = ((60 / self.BPM) / 4) / 4
         
-        # Initialise candidates list
-        self.candidates = dict()
+        # Initialise candidates list, ranked on the current score (against the general preference)
+        # and on the preference profile of each type of sequence
+        self.candidates = Candidate_Store()
+        self.candidates.register('current', self.evaluate_current)
+        for preferences in [self.base_profile(), self.minor_profile(), self.major_profile(), self.section_profile(), self.end_profile()]:
+            if preferences is not None:
+                self.candidates.register(preferences, lambda scores, preferences = preferences: self.evaluate_scores(scores, preferences))
+        
+        # Number of candidates considered so far
+        self.considered = 0
+        
+        # Number of 16th notes played so far
+        self.tick = 0
         
         
         
     """
     Import the patterns from the specified libraries.
-    (Initially each library is mapped to a filepath)
+    (Initially each library is mapped to a filepath, the compiled libraries are shared by all players)
     """
     def import_libraries(self):
         
-        # Iterate the libraries
-        for key in self.libraries.keys():
-            
-            # Read the file
-            with open(self.libraries.get(key), 'r') as file:
-                patterns = file.readlines()
-            
-            # Initialise list of progressions / rhythms
-            library = list()
-            
-            # Iterate through each progression / rhythm
-            for pattern in patterns:
-
-                # Convert it to a list of integers
-                pattern = pattern.strip().split()
-                pattern = [int(char) for char in pattern]
-                if len(pattern) > 0:
-                    library.append(pattern)
-            
-            # Overwrite filepath with library
-            self.libraries[key] = library
+        # Each instance maps to the compiled libraries, the class only maps to the filepaths
+        self.libraries = {key: load(path) for key, path in self.libraries.items()}
     
    
           
@@ -117,22 +143,44 @@ class Player(threading.Thread):
         
         
     """ MAIN LOOP """
-                
+    
     """
-    Given a number of phrases (segments of 16 bars) and a BPM, improvise
+    Run the performance in this thread.
+    Whenever the performance has to wait, block until it may continue.
     """
     def run(self):
+        
+        for wait in self.perform():
+            
+            # Wait for a message
+            if isinstance(wait, Mailbox):
+                wait.wait(self.tick)
+            
+            # Wait for the next 16th note
+            else:
+                self.sync()
+            
+            
+                
+    """
+    Given a number of phrases (segments of 16 bars) and a BPM, improvise.
+    This is a generator: it yields whenever it has to wait, either for the next 16th note
+    or for a mailbox, so that it can be driven by a thread or by an event loop.
+    Players that take turns deliberate for a [share] of their deliberation time.
+    """
+    def perform(self, share = 1):
     
         # Play segments of 16 bars
         for phrase in range(self.phrases):
             
             # Create a base sequence for the phrase    
-            if len(self.candidates.keys()) > 0:
+            if len(self.candidates) > 0:
                 base = self.base_sequence()                
             else:
                 base = self.start_sequence()
             
             # Calculate the sequence length
+            yield from self.receive()
             sequence_length = sum([length for (_, length) in self.convert(base)])
             
             # Phrase length in 16th notes, (divided into 4 bar sections)
@@ -149,6 +197,10 @@ class Player(threading.Thread):
                 if length == SECTIONS * 64:
                     sequence = base
                 
+                # Nothing was considered in time, play the last sequence again
+                elif len(self.candidates) == 0:
+                    pass
+                
                 # Vary for the rest of the section (of 4 bars)
                 elif section == 1 and length % 64 == sequence_length:
                     sequence = self.major_variation()
@@ -167,13 +219,15 @@ class Player(threading.Thread):
                     sequence = self.section_variation()
                     
                 # Reset candidate list
-                self.candidates = {}    
+                self.candidates.clear()
+                self.rescoring = dict()
                 
                 # Put sequence in short term memory
                 self.short_memory[self.ID] = sequence
+                self.memory_version += 1
                     
                 # Play the sequence
-                self.play_sequence(sequence)
+                yield from self.play_sequence(sequence, share)
                 
                 # Subtract the sequences length
                 length -= sequence_length
@@ -185,11 +239,13 @@ class Player(threading.Thread):
     """
     Takes a sequence, turns it to MIDI and plays it.
     It does so by counting in steps of 16th notes and starting / stopping chords accordingly.
-    While doing this, it also writes its output to a common dictionary and reads the other outputs.
+    While doing this, it also publishes its output to a common board and reads the other outputs.
+    (Yields the 16th note it is waiting for, deliberates for a [share] of the deliberation time)
     """
-    def play_sequence(self, sequence):
+    def play_sequence(self, sequence, share = 1):
         
         # Convert sequence to MIDI information
+        yield from self.receive()
         MIDI = self.convert(sequence)
         
         # Starting variables
@@ -217,23 +273,24 @@ class Player(threading.Thread):
                 # Load the next chord / note
                 notes, length = next(chord)
                 
+            # Publish the output before the drummer releases this 16th note
+            if not playing:
+                self.update(notes)
+            else:
+                self.sustain(notes)
+                
             # Consider candidates for the next sequence and return how long it took
-            deliberation_time = self.deliberate(self.deliberation_time)
+            deliberation_time = self.deliberate(self.deliberation_time * share)
                 
-            # Either wait or signal depending on the player
-            self.sync(step, deliberation_time)
+            # Wait for the 16th note to be released
+            yield self.tick
                 
             # To prevent it from repeating each 16th note
             if not playing:
                 
-                # Play the chord / note and update output
+                # Play the chord / note
                 playing = True
                 self.play(notes)
-                self.update(notes)
-                
-            else:
-                
-                self.sustain()
             
             # Read other agents' outputs
             self.listen()
@@ -241,6 +298,9 @@ class Player(threading.Thread):
             # Update to remaining length
             length -= 1
             
+            # Move on to the next 16th note
+            self.tick += 1
+            
             # Write everything to memory after every bar
             if (step + 1) % 16 == 0:
                 self.update_memory()
@@ -290,25 +350,20 @@ class Player(threading.Thread):
     """ NON VERBAL COMMUNICATION """
     
     """
-    Update the agent's current output to the given input.
-    Also sets the 'playing' variable to 1, indicating that a new chord / note is playing
+    Publish the agent's output for the current 16th note.
+    The 'playing' variable is 1, indicating that a new chord / note is playing
     """
     def update(self, notes):
-        
-        # Make sure that only 1 thread writes at a time
-        with self.lock:
-            self.output[self.ID] = [notes, 1] 
+        self.board.publish(self.tick, self.ID, (notes, 1))
             
             
             
     """
-    Set the 'playing' variable to 0, indicating that the same chord / note is still playing
+    Publish the agent's output for the current 16th note.
+    The 'playing' variable is 0, indicating that the same chord / note is still playing
     """
-    def sustain(self):
-        
-        # Make sure that only 1 thread writes at a time
-        with self.lock:
-            self.output[self.ID][1] = 0 
+    def sustain(self, notes):
+        self.board.publish(self.tick, self.ID, (notes, 0))
     
     
     
@@ -318,22 +373,26 @@ class Player(threading.Thread):
     """
     def listen(self):
         
-        # Wait for others to finish writing
-        self.barrier.wait()
+        # Read what everyone published for this 16th note
+        output = self.board.read(self.tick)
         
         # Cycle the players attented to
         for ID in self.attention:
             
+            # Skip players that didn't publish in time
+            if output is None or ID not in output:
+                continue
+            
             # If a new chord / note is played
-            if self.output[ID][1] == 1:
-                self.short_memory[ID].append(self.output[ID].copy())
+            if output[ID][1] == 1:
+                self.short_memory[ID].append(list(output[ID]))
             
             # If the same chord is still playing
             else:
                 
                 # If the chord is sustained from the last sequence
                 if len(self.short_memory[ID]) == 0:
-                    self.short_memory[ID].append(self.output[ID].copy())
+                    self.short_memory[ID].append(list(output[ID]))
                     self.short_memory[ID][-1][1] = -1
                    
                 # If the chord (started within the sequence) is sustained
@@ -343,19 +402,31 @@ class Player(threading.Thread):
                 # If the chord (started outside the sequence) is sustained
                 else:
                     self.short_memory[ID][-1][1] -= 1
+        
+        # The short memory changed
+        self.memory_version += 1
             
     
     
     """
     Handle the timing condition.
     (Overwritten by the drummer)
-    (i is used for the drummer to add 'swing')
     """
-    def sync(self, i: int, deliberation_time):
+    def sync(self):
         
-        # Wait for the drummer
+        # Wait for the drummer to release the current 16th note
+        # (also returns if it was released before this player started waiting)
         with self.timing:
-            self.timing.wait()
+            self.timing.wait_for(lambda: self.clock.tick >= self.tick)
+                
+    
+    
+    """
+    Wait for the messages needed to convert a sequence.
+    (Overwritten by the bass player)
+    """
+    def receive(self):
+        yield from ()
                 
     
     
@@ -368,6 +439,7 @@ class Player(threading.Thread):
         
         # Save output reconstruction
         self.long_memory.append(self.short_memory)
+        self.long_versions.append(self.memory_version)
         
         # Reset short memory
         self.reset_memory()
@@ -385,10 +457,15 @@ class Player(threading.Thread):
         for ID in self.attention + [self.ID]:
             empty[ID] = []            
         self.short_memory = empty
+        self.memory_version += 1
+        
+        # Scoring states are only valid for the memory they were built on
+        self.rescoring = dict()
         
         # Wipe the last phrase when the first segment of a new phrase is saved
         if len(self.long_memory) > SECTIONS * 4:
             self.long_memory = self.long_memory[SECTIONS * 4:]
+            self.long_versions = self.long_versions[SECTIONS * 4:]
         
         
         
@@ -402,8 +479,12 @@ class Player(threading.Thread):
         
         start = time.time()
         
+        # Let the controller hand out the deliberation time
+        if self.controller is not None:
+            deliberation_time = self.controller.start(self)
+        
         # Re-evaluate top sequence
-        if len(self.candidates.keys()) > 0:
+        if len(self.candidates) > 0:
             self.update_scores(3)
         
         # Determine what sequence to base the variation on
@@ -430,21 +511,32 @@ class Player(threading.Thread):
         else:
             i = (len(self.long_memory) + 1) % 4 
             sequence = self.long_memory[i].get(self.ID)
+        
+        # Let the worker processes create and evaluate the patterns
+        if self.pool is not None:
+            considered = self.considered
+            self.pool.deliberate(self, sequence, start, deliberation_time)
+            if self.controller is not None:
+                self.controller.finish(self, self.considered - considered)
+            return time.time() - start
             
-        current = time.time()
+        considered = 0
         
-        # Keep creating and evaluating new patterns for a given amount of time
-        while current - start < deliberation_time:
+        # Keep creating and evaluating blocks of new patterns for a given amount of time
+        block = self.next_block(start, considered, deliberation_time)
+        while block > 0:
             
-            if sequence == "start":
-                variation = self.start_sequence()
-
-            else:
-                variation = self.sequence_variation(sequence)
+            variations = [self.vary(sequence) for _ in range(block)]
+            
+            self.evaluate_sequences(variations)
             
-            self.evaluate_sequence(variation)
+            considered += block
+            block = self.next_block(start, considered, deliberation_time)
             
-            current = time.time()
+        self.considered += considered
+        
+        if self.controller is not None:
+            self.controller.finish(self, considered)
         
         # Return how long it actually took
         return time.time() - start
@@ -452,26 +544,99 @@ class Player(threading.Thread):
     
     
     """
-    TODO
+    Decide how many candidates to consider next (0 to stop deliberating).
+    Limited by time, or by the candidate budget if one is set.
     """
-    def evaluate_sequence(self, sequence):
+    def next_block(self, start, considered, deliberation_time):
         
-        # Score of the sequence against the current reconstruction
-        current = self.score(self.short_memory, sequence)
+        # Fixed number of candidates (offline rendering)
+        if self.candidate_budget is not None:
+            return min(BLOCK, self.candidate_budget - considered)
         
-        # Score of the sequence against the first sequence of the phrase
-        base = tuple()
-        if len(self.long_memory) in range(1, SECTIONS * 2 + 1):
-            base = self.score(self.long_memory[0], sequence)
+        # Adaptive budget: predict how many more candidates fit
+        if self.controller is not None:
+            return min(BLOCK, self.controller.affordable(self, considered))
+        
+        elapsed = time.time() - start
+        if elapsed >= deliberation_time:
+            return 0
+        
+        # Only consider as many candidates as there is time for (based on the time per candidate so far)
+        if considered > 0:
+            return max(1, min(BLOCK, int((deliberation_time - elapsed) * considered / elapsed)))
+        
+        return BLOCK
+    
+    
+    
+    """
+    Create a variation of a sequence, or a new starting sequence
+    """
+    def vary(self, sequence):
+        
+        if sequence == "start":
+            return self.start_sequence()
+        
+        return self.sequence_variation(sequence)
+    
+    
+    
+    """
+    Score a block of sequences and add them to the candidates
+    """
+    def evaluate_sequences(self, sequences):
+        
+        keys = [freeze(sequence) for sequence in sequences]
         
-        # Score of the sequence against the matching sequence of the previous section
-        section = tuple()
+        for scores, sequence, key in zip(self.rate(self.context(), sequences, keys), sequences, keys):
+            self.candidates.add(scores, sequence, key)
+        
+        
+        
+    """
+    Return the memory chunks that sequences are scored against, each with its version:
+    the current reconstruction, the first sequence of the phrase and the matching sequence of the previous section
+    (None if they don't apply yet)
+    """
+    def context(self):
+        
+        base = None
+        if len(self.long_memory) in range(1, SECTIONS * 2 + 1):
+            base = self.long_memory[0], self.long_versions[0]
+            
+        section = None
         if len(self.long_memory) in range(4, SECTIONS * 2 + 1):
-            section = self.score(self.long_memory[-4], sequence)
+            section = self.long_memory[-4], self.long_versions[-4]
             
-        scores = current, base, section
+        return (self.short_memory, self.memory_version), base, section
+    
+    
+    
+    """
+    Score a block of sequences against each memory chunk of a context
+    (scores that were calculated before for the same version of a chunk come from the cache)
+    """
+    def rate(self, context, sequences, keys = None):
+        
+        (short_memory, short_version), base_memory, section_memory = context
+        
+        if keys is None:
+            keys = [freeze(sequence) for sequence in sequences]
         
-        self.candidates[scores] = sequence
+        # Scores of the sequences against the current reconstruction
+        current = self.score_cache.score(self.score_block, short_memory, short_version, sequences, keys)
+        
+        # Scores of the sequences against the first sequence of the phrase
+        base = [tuple() for _ in sequences]
+        if base_memory is not None:
+            base = self.score_cache.score(self.score_block, *base_memory, sequences, keys)
+        
+        # Scores of the sequences against the matching sequence of the previous section
+        section = [tuple() for _ in sequences]
+        if section_memory is not None:
+            section = self.score_cache.score(self.score_block, *section_memory, sequences, keys)
+            
+        return list(zip(current, base, section))
         
         
         
@@ -506,9 +671,53 @@ class Player(threading.Thread):
     Given the candidates, a preference and a set of weights, find the best candidate 
     """
     def select_candidate(self, preferences):
-        candidates = self.candidates.keys()
-        best = min(candidates, key = lambda scores: self.evaluate_scores(scores, preferences))
-        return self.candidates.get(best)
+        
+        best = self.candidates.select(preferences)
+        
+        if best is None:
+            raise ValueError("There are no candidates to select from")
+        
+        return best
+    
+    
+    
+    """
+    Select the best candidate for a base sequence
+    """
+    def base_sequence(self):
+        return self.select_candidate(self.base_profile())
+    
+    
+    
+    """
+    Select the best candidate for a minor variation on the base sequence
+    """
+    def minor_variation(self):
+        return self.select_candidate(self.minor_profile())
+    
+    
+    
+    """
+    Select the best candidate for a major variation on the base sequence
+    """
+    def major_variation(self):
+        return self.select_candidate(self.major_profile())
+    
+    
+    
+    """
+    Select the best candidate for a variation on the according sequence of the previous section
+    """
+    def section_variation(self):
+        return self.select_candidate(self.section_profile())
+    
+    
+    
+    """
+    Select the best candidate for the end of a phrase, moving it into the next
+    """
+    def phrase_end(self):
+        return self.select_candidate(self.end_profile())
     
     
     
@@ -518,25 +727,67 @@ class Player(threading.Thread):
     def update_scores(self, number = 1):
         
         # Find the most promising sequence(s) (based on the incomplete short term memory)
-        candidates = self.candidates.keys()
-        selection = sorted(candidates, key = lambda scores: self.evaluate_current(scores))[:number]
+        selection = self.candidates.top('current', number)
         
         # Re-evaluate each of the best sequences
-        for scores in selection:
+        for scores, sequence in selection:
             current, base, section = scores
             
-            # Remove the key and sequence from the candidate list
-            sequence = self.candidates.pop(scores)
-            
             # Re-evaluate the scores with an updated short term memory
-            current = self.score(self.short_memory, sequence)
+            current = self.rescore(sequence)
             scores = current, base, section
             
             # Update the score
-            self.candidates[scores] = sequence
+            self.candidates.add(scores, sequence)
         
         
     
+    """
+    Re-score a candidate against the short term memory, which grew since the last 16th note.
+    Keeps a scoring state per candidate, so only the new steps have to be processed.
+    """
+    def rescore(self, sequence):
+        
+        key = freeze(sequence)
+        
+        if key not in self.rescoring:
+            self.rescoring[key] = self.scoring_state(self.short_memory, sequence)
+            
+        return self.update_state(self.rescoring.get(key), self.short_memory)
+        
+        
+    
+    """ CORPUS MODELS """
+    
+    """
+    Propose a rhythm (with at least [minimum] values) or a progression (with [minimum] to [maximum] values)
+    from the corpus model of a library. Returns None if there is no model, or if it can't propose one
+    (when nothing fits the limits at all, it isn't asked again with the same limits until the next 16th note).
+    """
+    def propose(self, key, minimum, maximum = None):
+        
+        model = self.markov.get(key)
+        if model is None:
+            return None
+        
+        # Forget the dead ends of earlier 16th notes
+        if self.dead_ends[0] != self.tick:
+            self.dead_ends = (self.tick, set())
+        
+        limits = key, minimum, maximum
+        if limits in self.dead_ends[1]:
+            return None
+        
+        pattern = model.rhythm(minimum) if key == 'rhythms' else model.progression(minimum, maximum)
+        
+        # Only give up on the limits when the model can't even start a pattern, not after an unlucky draw
+        if pattern is None and model.dead_end(minimum, maximum, key == 'rhythms'):
+            self.dead_ends[1].add(limits)
+        
+        return pattern
+    
+    
+    
     """ SUBCLASS SPECIFIC IMPLEMENTATIONS """
         
     """
@@ -547,6 +798,45 @@ class Player(threading.Thread):
     
     
     
+    """
+    Calculate the scores of a block of sequences given a memory chunk
+    (by default one by one)
+    """
+    def score_batch(self, memory, sequences):
+        return [self.score(memory, sequence) for sequence in sequences]
+    
+    
+    
+    """
+    Calculate the scores of a block of sequences given a memory chunk,
+    one by one when there are fewer than a full block (a batch only pays off for full blocks)
+    """
+    def score_block(self, memory, sequences):
+        
+        if len(sequences) < BLOCK:
+            return [self.score(memory, sequence) for sequence in sequences]
+        
+        return self.score_batch(memory, sequences)
+    
+    
+    
+    """
+    Create the scoring state of a sequence, to be updated as the memory grows
+    (by default it simply scores the sequence again each time)
+    """
+    def scoring_state(self, memory, sequence):
+        return sequence
+    
+    
+    
+    """
+    Update a scoring state with the new steps in the memory and return the score
+    """
+    def update_state(self, state, memory):
+        return self.score(memory, state)
+    
+    
+    
     """
     Generate a random variation given a sequence
     """
@@ -564,42 +854,42 @@ class Player(threading.Thread):
     
     
     """
-    Generate a base sequence
+    Return the preference profile of a base sequence: metric preferences & weights,
+    and the importance of each type of sequence it is scored against (None if the player doesn't select candidates)
     """
-    def base_sequence(self):
+    def base_profile(self):
         pass
     
     
     
     """
-    Make a variation on a given base pattern
+    Return the preference profile of a minor variation on the base sequence
     """
-    def minor_variation(self):
+    def minor_profile(self):
         pass
     
     
     
     """
-    Make a variation on a given base pattern
+    Return the preference profile of a major variation on the base sequence
     """
-    def major_variation(self):
+    def major_profile(self):
         pass
     
     
     
     """
-    Find the according sequence in the memory (based on the length and sequence length),
-    pass it to the subclass implementation to process further.
+    Return the preference profile of a variation on the according sequence of the previous section
     """
-    def section_variation(self):
+    def section_profile(self):
         pass
         
         
         
     """
-    Generates a pattern for the end of a phrase, moving it into the next
+    Return the preference profile of the sequence that ends a phrase
     """
-    def phrase_end(self):
+    def end_profile(self):
         pass
     
     
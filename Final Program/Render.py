@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:38:16 2026
+
+@author: beaun
+"""
+
+from Chord_Player import Chord_Player
+from Melody_Player import Melody_Player
+from Drum_Player import Drum_Player
+from Bass_Player import Bass_Player
+from Board import Board, Mailbox
+from Clock import Virtual_Clock
+from Search_Pool import Search_Pool
+import os
+import threading
+import mido
+
+# Set scale, BPM and nr of phrases played per render
+root = 'A'
+mode = 'Minor'
+BPM = 100
+phrases = 1
+
+# Number of files to render
+renders = 10
+
+# Number of candidates each player considers every 16th note
+budget = 20
+
+# Number of worker processes that search candidates for each player (0 searches in the player itself)
+workers = 0
+
+# Folder to write the MIDI files to
+folder = "Renders"
+
+# MIDI resolution (ticks per quarter note)
+PPQ = 96
+
+
+
+"""
+Stand-in for a MIDI port. Stores every message a player sends,
+stamped with the 16th note the player is on.
+"""
+class Track:
+
+    """
+    Constructor
+    """
+    def __init__(self, name):
+        self.name = name
+        self.player = None
+        self.messages = list()
+
+
+
+    """
+    Save a message at the player's current 16th note.
+    (Notes are stopped before the player syncs, so at that point it is already on the next 16th note)
+    """
+    def send(self, message):
+        self.messages.append((self.player.tick, message))
+
+
+
+    """
+    Turn the stored messages into a MIDI track.
+    Timestamps are converted from 16th notes (with swing) to ticks.
+    """
+    def to_MIDI(self, swing):
+
+        track = mido.MidiTrack()
+        track.append(mido.MetaMessage('track_name', name = self.name, time = 0))
+
+        # Notes that are still sounding, by channel & note
+        active = set()
+
+        last = 0
+        end = 0
+
+        for step, message in self.messages:
+
+            # Position of the 16th note in ticks (off-beats are delayed by the swing)
+            time = round((step + (swing if step % 2 == 1 else 0)) * PPQ / 4)
+            end = max(end, time)
+
+            key = message.channel, message.note
+
+            if message.type == 'note_on':
+
+                # The drummer never stops its notes, stop them before they're hit again
+                if key in active:
+                    track.append(mido.Message('note_off', note = message.note, channel = message.channel, time = time - last))
+                    last = time
+
+                active.add(key)
+
+            elif message.type == 'note_off':
+
+                # Skip notes that aren't playing
+                if key not in active:
+                    continue
+
+                active.remove(key)
+
+            track.append(message.copy(time = time - last))
+            last = time
+
+        # Stop everything that is still playing at the end
+        for channel, note in sorted(active):
+            track.append(mido.Message('note_off', note = note, channel = channel, time = end - last))
+            last = end
+
+        return track
+
+
+
+"""
+Let the players improvise on a virtual clock (without sleeping),
+and write everything they play to a MIDI file with a track per player.
+"""
+def render(path, root, mode, phrases, BPM, budget, workers = 0):
+
+    # Create thread guides
+    timing = threading.Condition()
+    board = Board(4)
+    clock = Virtual_Clock(BPM)
+    guides = (timing, board, clock)
+
+    # Create a track for each player
+    tracks = [Track(name) for name in ["Bass", "Chords", "Melody", "Drums"]]
+
+    # Create player threads
+    bass = Bass_Player(root, mode, phrases, BPM, guides, tracks[0], channel = 1)
+    chords = Chord_Player(root, mode, phrases, BPM, guides, tracks[1], channel = 2)
+    melody = Melody_Player(root, mode, phrases, BPM, guides, tracks[2], channel = 3)
+    drums = Drum_Player(root, mode, phrases, BPM, guides, tracks[3], channel = 4)
+    players = [bass, chords, melody, drums]
+
+    # This allows for a (temporary) communication channel between the bass & chord player
+    bass_output = Mailbox()
+    chords.bass_output = bass_output
+    bass.bass_output = bass_output
+
+    for player, track in zip(players, tracks):
+
+        # Consider a fixed number of candidates instead of a fixed amount of time
+        player.candidate_budget = budget
+
+        track.player = player
+
+    # Create worker pools (the bass only follows the chords)
+    pools = list()
+    if workers > 0:
+        for player in [chords, melody, drums]:
+            player.pool = Search_Pool(player, workers)
+            pools.append(player.pool)
+
+    # Play
+    clock.start()
+    for player in players:
+        player.start()
+    for player in players:
+        player.join()
+
+    # Stop the workers
+    for pool in pools:
+        pool.close()
+
+    # Create MIDI file, the first track holds the tempo
+    MIDI = mido.MidiFile(type = 1, ticks_per_beat = PPQ)
+    tempo = mido.MidiTrack()
+    tempo.append(mido.MetaMessage('set_tempo', tempo = mido.bpm2tempo(BPM), time = 0))
+    MIDI.tracks.append(tempo)
+
+    for track in tracks:
+        MIDI.tracks.append(track.to_MIDI(clock.swing))
+
+    MIDI.save(path)
+
+
+
+""" RENDERING """
+
+print("\nScale:\t\t{:s} {:s}".format(root, mode))
+print("BPM:\t\t{:d}".format(BPM))
+print("Phrases:\t{:d}".format(phrases))
+print("Budget:\t\t{:d} candidates".format(budget))
+
+os.makedirs(folder, exist_ok = True)
+
+for i in range(renders):
+
+    path = os.path.join(folder, "render {:03d}.mid".format(i + 1))
+    render(path, root, mode, phrases, BPM, budget, workers)
+
+    print("Rendered", path)
\ No newline at end of file
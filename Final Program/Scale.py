@@ -5,6 +5,7 @@ Created on Wed Mar 13 14:05:12 2024
 @author: beaun
 """
 
+import threading
 import numpy as np
 
 
@@ -47,27 +48,133 @@ NOTES = {
 
 
 
+# Octaves a note or chord can be modulated
+OCTAVES = range(-5, 11)
+
+# Modes that have relative chords
+RELATIVES = ['Major', 'Minor', 'Harmonic Minor']
+
+# Scales that are made already, by (root, mode)
+instances = dict()
+lock = threading.Lock()
+
+
+
+"""
+Return the fingerprint of a chord as a 12 bit number, where each bit stands for a pitch class (note modulo 12)
+"""
+def chord_mask(chord):
+    
+    mask = 0
+    for note in chord:
+        mask |= 1 << (note % 12)
+        
+    return mask
+
+
+
+"""
+Return the scale of a root (as a MIDI note) and mode. Each scale is made once, every caller gets the same instance.
+"""
+def interned(root: int, mode: str):
+
+    with lock:
+
+        if (root, mode) not in instances:
+            scale = object.__new__(Scale)
+            scale.build(root, mode)
+            instances[(root, mode)] = scale
+
+        return instances.get((root, mode))
+
+
+
+"""
+A scale, with its notes, chords and relative chords looked up in tables that are made once.
+Scales are shared (every Scale('A', 'Minor') is the same instance) and never change,
+modulating or flipping a scale returns another scale.
+"""
 class Scale:
     
     root: int
     mode: str
-    interval: list
+    interval: tuple
     
     
     
     """
-    Constructor
+    Constructor (returns the shared instance of the scale)
     """
-    def __init__(self, root: str, mode: str):
+    def __new__(cls, root: str, mode: str):
         
         # Verify root note and mode
         assert root in NOTES, "{:s} is not a valid note!".format(root)
         assert mode in MODES, "{:s} {:s} is not a valid mode or hasn't been implemented!".format(root, mode)
-       
+        
+        return interned(NOTES.get(root), mode)
+    
+    
+    
+    """
+    Make the tables of a scale (only once per scale)
+    """
+    def build(self, root: int, mode: str):
+        
         # Set variables
-        self.root = NOTES.get(root)
+        self.root = root
         self.mode = mode
-        self.interval = MODES.get(mode)
+        self.interval = tuple(MODES.get(mode))
+        
+        numbers = range(1, self.size() + 1)
+        
+        # Notes, triads & seventh chords by (number, octave)
+        self.notes = {(nr, octave): self.make_chord(nr, octave, 1)[0] for nr in numbers for octave in OCTAVES}
+        self.triads = {(nr, octave): self.make_chord(nr, octave, 3) for nr in numbers for octave in OCTAVES}
+        self.sevenths = {(nr, octave): self.make_chord(nr, octave, 4) for nr in numbers for octave in OCTAVES}
+        
+        # Relative chords
+        self.relatives = {nr: self.find_relative(nr) for nr in numbers} if mode in RELATIVES else dict()
+        
+        # Pitch classes of each triad & seventh chord (see chord_mask)
+        self.fingerprints = {
+            'triads':   {nr: chord_mask(self.triads.get((nr, 0))) for nr in numbers},
+            'sevenths': {nr: chord_mask(self.sevenths.get((nr, 0))) for nr in numbers}}
+        
+        # The chords (numbers) each set of pitch classes can be in this scale
+        self.degrees = dict()
+        for nr in numbers:
+            for mask in set([self.fingerprints.get('triads').get(nr), self.fingerprints.get('sevenths').get(nr)]):
+                self.degrees[mask] = self.degrees.get(mask, tuple()) + (nr,)
+    
+    
+    
+    """
+    Create the nth chord of a scale with a number of notes (stacked in thirds), modulated up or down some octaves
+    """
+    def make_chord(self, nr: int, octave: int, notes: int):
+        
+        nr -= 1
+        chord = list()
+        
+        for i in range(0, 2 * notes, 2):
+            
+            note = self.root + self.interval[(nr + i) % self.size()] + octave * 12
+            
+            # Check if the note crosses the octave
+            if nr + i >= self.size():
+                note += 12
+                
+            chord.append(note)
+        
+        return tuple(chord)
+    
+    
+    
+    """
+    Scales are shared, so worker processes look the scale up instead of receiving a copy
+    """
+    def __reduce__(self):
+        return interned, (self.root, self.mode)
         
         
     
@@ -78,11 +185,12 @@ class Scale:
     """
     def note(self, nr: int, octave = 0):
         
-        # Verify that note is in scale
-        assert nr <= self.size(), "There are only {:d} notes in this scale!".format(self.size())
-        assert octave >= -5 and octave <= 10, "The note can not be modulated {:d} octaves!".format(octave)
+        try:
+            return self.notes[nr, octave]
         
-        return self.root + self.interval[nr - 1] + octave * 12
+        # Verify that note is in scale
+        except KeyError:
+            raise ValueError("There are only {:d} notes in this scale, which can be modulated {:d} to {:d} octaves!".format(self.size(), OCTAVES[0], OCTAVES[-1])) from None
     
     
     
@@ -91,23 +199,12 @@ class Scale:
     """
     def triad(self, nr: int, octave = 0):
         
-        # Verify if chord exists within scale
-        assert nr <= self.size(), "There are only {:d} triads in this scale!".format(self.size())
-        
-        # Get chord notes
-        nr -= 1
-        root = self.root + self.interval[nr] + octave * 12
-        second = self.root + self.interval[(nr + 2) % self.size()] + octave * 12
-        third = self.root + self.interval[(nr + 4) % self.size()] + octave * 12
+        try:
+            return self.triads[nr, octave]
         
-        # Check if notes cross the octave
-        if nr + 2 >= self.size():
-            second += 12
-        if nr + 4 >= self.size():
-            third += 12
-            
-        # Return chord
-        return [root, second, third]
+        # Verify if chord exists within scale
+        except KeyError:
+            raise ValueError("There are only {:d} triads in this scale, which can be modulated {:d} to {:d} octaves!".format(self.size(), OCTAVES[0], OCTAVES[-1])) from None
     
     
     
@@ -116,26 +213,12 @@ class Scale:
     """
     def seventh(self, nr: int, octave = 0):
         
-        # Verify if chord exists within scale
-        assert nr <= self.size(), "There are only {:d} seventh chords in this scale!".format(self.size())
-        
-        # Get chord notes
-        nr -= 1
-        root = self.root + self.interval[nr] + octave * 12
-        second = self.root + self.interval[(nr + 2) % self.size()] + octave * 12
-        third = self.root + self.interval[(nr + 4) % self.size()] + octave * 12
-        fourth = self.root + self.interval[(nr + 6) % self.size()] + octave * 12
+        try:
+            return self.sevenths[nr, octave]
         
-        # Check if notes cross the octave
-        if nr + 2 >= self.size():
-            second += 12
-        if nr + 4 >= self.size():
-            third += 12
-        if nr + 6 >= self.size():
-            fourth += 12
-            
-        # Return chord
-        return [root, second, third, fourth]
+        # Verify if chord exists within scale
+        except KeyError:
+            raise ValueError("There are only {:d} seventh chords in this scale, which can be modulated {:d} to {:d} octaves!".format(self.size(), OCTAVES[0], OCTAVES[-1])) from None
     
     
     
@@ -155,9 +238,18 @@ class Scale:
     """
     def relative(self, nr: int):
         
-        # Verify if chord exists within scale
-        assert nr <= self.size(), "There are only {:d} root notes in this scale!".format(self.size())
-        assert self.mode in ['Major', 'Minor', 'Harmonic Minor'], "Relative chords have only been implemented for major and minor scales."
+        # Verify if the mode has relative chords & if the chord exists within scale
+        assert self.mode in RELATIVES, "Relative chords have only been implemented for major and minor scales."
+        assert nr in self.relatives, "There are only {:d} root notes in this scale!".format(self.size())
+        
+        return self.relatives[nr]
+    
+    
+    
+    """
+    Find the relative chord of a chord (for the table of relative chords)
+    """
+    def find_relative(self, nr: int):
         
         # relative chords are obtained by moving up 5 (from major to minor)
         if self.mode == 'Major':
@@ -195,44 +287,29 @@ class Scale:
     Given a progression, try abstracting it to the chord positions on the scale.
     """
     def abstract_progression(self, progression):
-        
-        # List of all chords, modulo 12 for each note
-        triads = [None]
-        sevenths = [None]
-        
-        for nr in range(1, self.size() + 1):
-            
-            # Create fingerprint (each note modulo 12)
-            chord = self.triad(nr)
-            fingerprint = set([note % 12 for note in chord])
-            triads.append(fingerprint)
-            
-            # Create fingerprint (each note modulo 12)
-            chord = self.seventh(nr)
-            fingerprint = set([note % 12 for note in chord])
-            sevenths.append(fingerprint)
+        return self.abstract_masks([chord_mask(chord) for chord in progression])
+    
+    
+    
+    """
+    Given a progression of chord fingerprints (see chord_mask), try abstracting it to the chord positions on the scale.
+    """
+    def abstract_masks(self, progression):
         
         # List of the progression's chords reduced to their position in the scale
         abstraction = []
         
-        for chord in progression:
-            
-            fingerprint = set([note % 12 for note in chord])
-            found = False
+        for mask in progression:
             
-            # Try to match the fingerprint with a chord in the scale
-            for nr in range(1, self.size() + 1):
-                
-                # The chord matches the fingerprint
-                if triads[nr] == fingerprint or sevenths[nr] == fingerprint:
-                    
-                    abstraction.append(nr)
-                    found = True
+            # Look up the chords that match the fingerprint
+            degrees = self.degrees.get(mask)
             
             # None of the chords match the fingerprint
-            if not found:
+            if degrees is None:
                 return None
             
+            abstraction.extend(degrees)
+            
         return abstraction
     
     
@@ -240,24 +317,24 @@ class Scale:
     """ OTHER TOOLS """
             
     """
-    Modulate the root note up or down
+    Return the scale with the root note modulated up or down
     """
     def modulate(self, mod):
-        self.root = (self.root + mod) % 12 + 60
+        return interned((self.root + mod) % 12 + 60, self.mode)
         
         
         
     """
-    Flip major to minor and vice versa
+    Return the scale with major flipped to minor and vice versa
     """
     def flip_mode(self):
         
         # switch to minor
         if self.mode == 'Major':
-            self.mode = 'Minor'
-            self.interval = MODES.get('Minor') 
+            return interned(self.root, 'Minor')
             
         # switch to major
         elif self.mode == 'Minor':
-            self.mode = 'Major'
-            self.interval = MODES.get('Major') 
\ No newline at end of file
+            return interned(self.root, 'Major')
+        
+        return self
\ No newline at end of file
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:46:21 2026
+
+@author: beaun
+"""
+
+from collections import OrderedDict
+
+from Candidate_Store import freeze
+
+
+
+# Number of scores kept in the cache
+SIZE = 4096
+
+
+
+"""
+Cache of the scores of sequences against memory chunks.
+A score is stored under the version of the memory chunk and the (hashable) sequence,
+so when the memory changes, it gets a new version and the old scores are never looked up again.
+They are evicted once they are the least recently used.
+"""
+class Score_Cache:
+
+    """
+    Constructor
+    """
+    def __init__(self, size = SIZE):
+
+        self.size = size
+        self.scores = OrderedDict()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+
+
+    """
+    Return the scores of a block of sequences against a memory chunk (with a given version),
+    the ones that are not in the cache are calculated together with the given score function.
+    The hashable forms of the sequences can be given if they are already known.
+    """
+    def score(self, score_block, memory, version, sequences, frozen = None):
+
+        if frozen is None:
+            frozen = [freeze(sequence) for sequence in sequences]
+
+        keys = [(version, key) for key in frozen]
+
+        found = dict()
+        missing = dict()
+
+        for key, sequence in zip(keys, sequences):
+
+            # Hit: mark it as recently used
+            if key in self.scores:
+                self.hits += 1
+                self.scores.move_to_end(key)
+                found[key] = self.scores.get(key)
+
+            # Duplicate within the block
+            elif key in missing:
+                self.hits += 1
+
+            else:
+                self.misses += 1
+                missing[key] = sequence
+
+        # Score the misses together
+        if len(missing) > 0:
+            for key, result in zip(missing.keys(), score_block(memory, list(missing.values()))):
+                found[key] = result
+                self.scores[key] = result
+
+        # Evict the least recently used scores
+        while len(self.scores) > self.size:
+            self.scores.popitem(last = False)
+
+        return [found.get(key) for key in keys]
+
+
+
+    """
+    Return the hits, misses and hit rate
+    """
+    def report(self):
+
+        total = self.hits + self.misses
+
+        return {'hits': self.hits, 'misses': self.misses, 'rate': self.hits / total if total > 0 else 0}
\ No newline at end of file
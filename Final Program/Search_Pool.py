@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 12:24:50 2026
+
+@author: beaun
+"""
+
+import multiprocessing
+import queue
+import random
+import time
+
+from Random_Configuration import SEED
+from Score_Cache import Score_Cache
+
+
+
+# Number of candidates a worker creates and scores per task
+CHUNK = 16
+
+# Player variables the workers need to create and score candidates
+STATE = ['scale', 'libraries', 'reflection', 'cooperation']
+
+# Variables only some players have
+OPTIONAL = ['pairs', 'lengths', 'markov']
+
+
+
+"""
+Pool of worker processes that create and score candidates for a player.
+Every 16th note the workers receive the memory context once,
+after which they stream back scored candidates in chunks.
+Each chunk has its own seed, so a fixed number of candidates gives the same result every run.
+"""
+class Search_Pool:
+
+    """
+    Constructor
+    """
+    def __init__(self, player, workers: int):
+
+        # Fork where possible, so the script doesn't have to be imported again by every worker
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+
+        self.ID = player.ID
+
+        # Base seed for the chunks
+        self.seed = SEED if SEED is not None else random.getrandbits(64)
+
+        # 16th note that is being searched (workers skip chunks of earlier 16th notes)
+        self.current = context.Value('q', -1)
+
+        # A task queue per worker and a shared queue for the results
+        self.tasks = [context.Queue() for _ in range(workers)]
+        self.results = context.Queue()
+
+        # Number of candidates scored by the workers
+        self.scored = 0
+
+        # Start workers
+        state = {key: getattr(player, key) for key in STATE}
+        state.update({key: getattr(player, key) for key in OPTIONAL if hasattr(player, key)})
+        self.workers = list()
+        for i in range(workers):
+            worker = context.Process(target = work, args = (type(player), state, i, self.tasks[i], self.results, self.current), daemon = True)
+            worker.start()
+            self.workers.append(worker)
+
+
+
+    """
+    Return the seed of a chunk
+    """
+    def chunk_seed(self, tick, chunk):
+        return "{}-{:s}-{:d}-{:d}".format(self.seed, self.ID, tick, chunk)
+
+
+
+    """
+    Give a worker a chunk of candidates to create and score
+    """
+    def assign(self, worker, tick, chunk, size):
+        self.tasks[worker].put(('search', tick, chunk, size, self.chunk_seed(tick, chunk)))
+
+
+
+    """
+    Let the workers create and score variations of a sequence for the player's current 16th note.
+    Stops when the player's deliberation time is up (once the first chunk was added), or when its candidate budget is reached.
+    Chunks are added in order, so the candidates don't depend on which worker was fastest.
+    """
+    def deliberate(self, player, sequence, start, deliberation_time):
+
+        tick = player.tick
+        workers = len(self.workers)
+        budget = player.candidate_budget
+
+        # Skip anything left of the previous 16th note
+        self.current.value = tick
+
+        # Send the memory context once
+        context = player.context()
+        for tasks in self.tasks:
+            tasks.put(('context', tick, context, sequence))
+
+        # Fixed number of candidates: hand out all chunks at once
+        if budget is not None:
+            chunks = (budget + CHUNK - 1) // CHUNK
+            for chunk in range(chunks):
+                self.assign(chunk % workers, tick, chunk, min(CHUNK, budget - chunk * CHUNK))
+
+        # Fixed amount of time: keep each worker 2 chunks ahead
+        else:
+            chunks = 2 * workers
+            for chunk in range(chunks):
+                self.assign(chunk % workers, tick, chunk, CHUNK)
+
+        finished = dict()
+        added = 0
+
+        while True:
+
+            # Wait for the next chunk (as long as there is time, but always for the first one)
+            if budget is not None:
+                if added == chunks:
+                    break
+                timeout = None
+            elif added == 0:
+                timeout = None
+            else:
+                timeout = deliberation_time - (time.time() - start)
+                if timeout <= 0:
+                    break
+
+            try:
+                result_tick, worker, chunk, candidates = self.results.get(timeout = timeout)
+            except queue.Empty:
+                break
+
+            # Left over from an earlier 16th note
+            if result_tick != tick:
+                continue
+
+            finished[chunk] = candidates
+
+            # Keep the worker busy
+            if budget is None:
+                self.assign(worker, tick, chunks, CHUNK)
+                chunks += 1
+
+            # Add the chunks that are next in line
+            while added in finished:
+                self.add(player, finished.pop(added))
+                added += 1
+
+        # Add the rest (only when the time is up)
+        for chunk in sorted(finished.keys()):
+            self.add(player, finished.get(chunk))
+
+
+
+    """
+    Add a chunk of scored candidates to the player's candidates
+    """
+    def add(self, player, candidates):
+
+        for scores, sequence in candidates:
+            player.candidates.add(scores, sequence)
+
+        player.considered += len(candidates)
+        self.scored += len(candidates)
+
+
+
+    """
+    Stop the workers
+    """
+    def close(self):
+
+        for tasks in self.tasks:
+            tasks.put(None)
+
+        for worker in self.workers:
+            worker.join()
+
+
+
+""" WORKER """
+
+"""
+Create and score chunks of candidates until told to stop
+"""
+def work(cls, state, index, tasks, results, current):
+
+    # Recreate the player, without thread, port etc.
+    player = cls.__new__(cls)
+    player.__dict__.update(state)
+    player.score_cache = Score_Cache()
+
+    context = None
+    sequence = None
+
+    while True:
+
+        task = tasks.get()
+
+        # Stop
+        if task is None:
+            return
+
+        # New memory context and sequence to vary on
+        if task[0] == 'context':
+            _, tick, context, sequence = task
+            continue
+
+        _, tick, chunk, size, seed = task
+        player.tick = tick
+
+        # Skip chunks of 16th notes that have passed
+        if tick < current.value:
+            continue
+
+        random.seed(seed)
+
+        variations = [player.vary(sequence) for _ in range(size)]
+        candidates = list(zip(player.rate(context, variations), variations))
+
+        results.put((tick, index, chunk, candidates))
\ No newline at end of file
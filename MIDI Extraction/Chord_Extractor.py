@@ -7,41 +7,94 @@ Created on Sun May  5 20:00:18 2024
 
 """ IMPORTS """
 
-from MIDI_Extractor import collect_paths, read_file, reduce
-from Scale import Scale
+from MIDI_Extractor import walk_paths, extract, reduce, Pattern_Set, counts_path, model_path
+from Scale import Scale, interned
+from Markov import Ngram_Counter
 from Melody_Rhythms import split
 
 
 
 """ FUNCTIONS """
 
+# Modes a progression can be in
+MODES = ['Minor', 'Major']
+
+# Keys a progression can be in: every root in minor & major (bit k of a set of keys stands for KEYS[k])
+KEYS = [interned(60 + root, mode) for mode in MODES for root in range(12)]
+
+
+
+"""
+Make the key tables. For each chord fingerprint (see chord_mask) they hold the set of keys the chord is in,
+and the set of keys where it is the first chord, as a number with a bit per key.
+"""
+def key_tables():
+    
+    fits = [0] * 4096
+    tonics = [0] * 4096
+    
+    for k, scale in enumerate(KEYS):
+        for mask, degrees in scale.degrees.items():
+            
+            fits[mask] |= 1 << k
+            if 1 in degrees:
+                tonics[mask] |= 1 << k
+                
+    return fits, tonics
+
+
+
+fits, tonics = key_tables()
+
+
+
 """
-Cycle a scale (major & minor) and try to find a satisfying abstraction
+Find the keys a progression (of chord fingerprints) can be abstracted in, in a single pass over its chords:
+the keys that contain every chord, and where at least one of them is the first chord
+"""
+def detect_keys(progression):
+    
+    keys = (1 << len(KEYS)) - 1
+    tonic = 0
+    
+    for mask in progression:
+        keys &= fits[mask]
+        tonic |= tonics[mask]
+        
+    return keys & tonic
+
+
+
+"""
+Find an abstraction of a progression (of chord fingerprints), in the first key that fits it.
+Keys are tried like cycling a scale: from the given scale up the octave, then the same for the other mode (major / minor).
+Returns the abstraction and the scale it was found in (to start from for the next progression).
 """
 def find_abstraction(scale, progression):
     
+    keys = detect_keys(progression)
+    
+    # Root & mode of the scale (scales in other modes start from the first key)
+    if scale.mode in MODES:
+        root, mode = scale.root % 12, MODES.index(scale.mode)
+    else:
+        root, mode = 0, 0
+    
     # Try both major and minor
-    for _ in range(2):
+    for mode in [mode, 1 - mode]:
         
-        # Cycle the octave
-        for _ in range(12):
-            
-            # Attempt to abstract with the current scale
-            abstraction = scale.abstract_progression(progression)
-            
-            # If an abstraction has been found
-            if abstraction and 1 in abstraction:
-                
-                return abstraction
-                
-            # If no abstraction has been found
-            else:
-                
-                # Modulate the scale to the next
-                scale.modulate(1)
+        # The keys of this mode, rotated so the root of the scale comes first
+        cycle = (keys >> (12 * mode)) & 0xFFF
+        cycle = ((cycle >> root) | (cycle << (12 - root))) & 0xFFF
         
-        # Flip minor to major or vice versa
-        scale.flip_mode()
+        # Abstract with the first key that fits
+        if cycle:
+            step = (cycle & -cycle).bit_length() - 1
+            scale = KEYS[12 * mode + (root + step) % 12]
+            
+            return scale.abstract_masks(progression), scale
+    
+    return None, scale
         
         
 
@@ -97,93 +150,84 @@ directories = [
     "MIDI/TITAN/MELO/CHORDS/MAJ"
     ]
 
-# Collect paths to files
-paths = collect_paths(directories)
-    
-    
-    
-""" COLLECTING PROGRESSIONS """
-
-progressions = []
-
-for path in paths:
-    
-    # Convert to progression
-    progression = read_file(path)
-    
-    # Remove loops
-    progression = reduce(progression)
+# Go through the paths to the files (they are read as they are needed)
+paths = walk_paths(directories)
     
-    progressions.append(progression)
     
     
+""" EXTRACT RHYTHMS & ABSTRACT PROGRESSIONS """
 
-""" EXTRACT RHYTHMS """
+# Output files
+rhythms_path = 'Patterns/Chords/rhythms (extraction).txt'
+progressions_path = 'Patterns/Chords/progressions (extraction).txt'
 
-# Extract rhythms from the chord progressions
-rhythms = [[length for (chord, length) in progression] for progression in progressions]
+# Create scale
+scale = Scale('C', 'Minor')
 
-# Reduce rhythms
-rhythms = [reduce(rhythm) for rhythm in rhythms]
+# Rhythms & progressions that have been written already (rotations of a loop are the same)
+rhythms_selection = Pattern_Set()
+progressions_selection = Pattern_Set()
 
-rhythms_selection = list()
+# Transitions between the values of every rhythm & progression that is found (see Markov)
+rhythms_model = Ngram_Counter()
+progressions_model = Ngram_Counter()
 
-# Remove rhythms that don't add up to a multiple of 16 and remove duplicates
-for rhythm in rhythms:
-    if suitable(rhythm):
+# The files are parsed in parallel (see extract), each result is written to the files as soon as it comes in
+with open(rhythms_path, 'w') as rhythms_file, open(progressions_path, 'w') as progressions_file:
 
-        # Split into chunks that sum to 16
-        chunks = split(rhythm)
+    for path, progression in extract(paths):
         
-        for rhythm in chunks:
-            
-            if rhythm not in rhythms_selection:
-                rhythms_selection.append(rhythm)
-
-
-
-""" ABSTRACT PROGRESSIONS """
-
-# Extract chords from the chord progressions
-chord_progressions = [[list(chord) for (chord, length) in progression] for progression in progressions]
-
-# Create scale
-scale = Scale('C', 'Minor')
-
-abstract_progressions = []
-
-# Abstract progressions
-for progression in chord_progressions:
-    
-    abstraction = find_abstraction(scale, progression)
+        # Extract the rhythm from the chord progression and reduce it
+        rhythm = reduce([length for (chord, length) in progression])
+        
+        # Remove rhythms that don't add up to a multiple of 16 and remove duplicates
+        if suitable(rhythm):
     
-    # If an abstraction has been found
-    if abstraction:
+            # Split into chunks that sum to 16
+            chunks = split(rhythm)
+            
+            for rhythm in chunks:
+                
+                rhythms_model.add(rhythm)
+                
+                if rhythms_selection.add(rhythm):
+                    
+                    # Join the elements of the rhythm into a string and write it to the file
+                    rhythms_file.write(' '.join(map(str, rhythm)) + '\n')
         
-        # Simplify progression
-        abstraction = simplify(abstraction)
+        # Extract chords from the chord progression (as fingerprints of their pitch classes, see read_events)
+        chords = [chord for (chord, length) in progression]
         
-        # Remove loops
-        abstraction = reduce(abstraction)
+        # Abstract the progression (the scale it is found in is the first to try for the next one)
+        abstraction, scale = find_abstraction(scale, chords)
         
-        abstract_progressions.append(abstraction)
+        # If an abstraction has been found
+        if abstraction:
+            
+            # Simplify progression
+            abstraction = simplify(abstraction)
+            
+            # Remove loops
+            abstraction = reduce(abstraction)
+            
+            progressions_model.add(abstraction)
+            
+            # Join the elements of the progression into a string and write it to the file (if it is new)
+            if progressions_selection.add(abstraction):
+                progressions_file.write(' '.join(map(str, abstraction)) + '\n')
+            
 
 
+""" WRITE PATTERN COUNTS """
 
-""" WRITE RESULTS TO FILE """
+# How often each pattern was found, alongside the libraries
+rhythms_selection.write_counts(counts_path(rhythms_path))
+progressions_selection.write_counts(counts_path(progressions_path))
 
-# Write rhythms to file
-with open('Patterns/Chords/rhythms (extraction).txt', 'w') as file:
-    
-    for progression in rhythms_selection:
-        
-        # Join the elements of the progression list into a string and write it to the file
-        file.write(' '.join(map(str, progression)) + '\n')
-        
-# Write chord progressions to file
-with open('Patterns/Chords/progressions (extraction).txt', 'w') as file:
-    
-    for progression in abstract_progressions:
-        
-        # Join the elements of the progression list into a string and write it to the file
-        file.write(' '.join(map(str, progression)) + '\n')   
\ No newline at end of file
+
+
+""" WRITE N-GRAM MODELS """
+
+# Transition tables the players draw new rhythms & progressions from, alongside the libraries
+rhythms_model.save(model_path(rhythms_path))
+progressions_model.save(model_path(progressions_path))
\ No newline at end of file
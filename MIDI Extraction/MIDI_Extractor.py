@@ -8,30 +8,79 @@ Created on Sun May  5 14:27:12 2024
 """ IMPORTS """
 
 import os
+import json
+import mmap
+import time
+import heapq
+import struct
+import hashlib
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import mido
 
 
 
+# Number of files a worker parses at a time
+CHUNK = 16
+
+# Number of chunks per worker that can be parsed ahead of the results being used (bounds the memory used)
+AHEAD = 4
+
+# Seconds between progress reports
+REPORT = 5
+
+# File that remembers what was extracted from each MIDI file
+MANIFEST = "Patterns/manifest.json"
+
+# Version of the extraction (manifests of another version are not used, change it when parsing changes)
+VERSION = 3
+
+# Number of data bytes of each channel message (by the first 4 bits of the status byte) and system message
+CHANNEL_BYTES = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+SYSTEM_BYTES = {0xF1: 1, 0xF2: 2, 0xF3: 1, 0xF6: 0, 0xF8: 0, 0xFA: 0, 0xFB: 0, 0xFC: 0, 0xFE: 0}
+
+# Types of the meta messages that matter for extraction
+META_TEMPO, META_END = 0x51, 0x2F
+
+# Longest message (in bytes) mido reads
+MAX_LENGTH = 1000000
+
+# Kinds of MIDI events (that matter for extraction)
+NOTE_ON, NOTE_OFF, TEMPO, END, OTHER = range(5)
+
+# Tempo of a MIDI file until it sets one (microseconds per quarter note)
+DEFAULT_TEMPO = 500000
+
+
+
 """ FUNCTIONS """
 
 """
-Given a list of directories, collect all of the MIDI file paths
+Given a list of directories, go through the MIDI file paths one by one
+(each directory is only read when the previous one is done)
 """
-def collect_paths(directories):
+def walk_paths(directories):
     
-    files = []
-
     for directory in directories:
     
         # Iterate over all files in the directory
-        for file in os.listdir(directory):
-            
-            # Construct full path MIDI file
-            path = os.path.join(directory, file)
-            
-            files.append(path)
-            
-    return files
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                
+                # Full path of the MIDI file
+                if entry.is_file():
+                    yield entry.path
+
+
+
+"""
+Given a list of directories, collect all of the MIDI file paths
+"""
+def collect_paths(directories):
+    return list(walk_paths(directories))
 
 
 
@@ -83,18 +132,652 @@ def read_file(path):
 
 
 
+"""
+Return the shortest period of a sequence: the smallest p where each element equals the one p places before it.
+Uses the prefix function (KMP failure function), so it only compares elements (they don't need to be hashable,
+which works for both chords and (chord, length) tuples) and takes linear time.
+"""
+def period(sequence):
+    
+    length = len(sequence)
+    
+    if length == 0:
+        return 0
+    
+    # prefix[i]: length of the longest proper prefix of sequence[:i + 1] that is also a suffix of it
+    prefix = [0] * length
+    k = 0
+    
+    for i in range(1, length):
+        
+        # Fall back to shorter prefixes until the next element matches
+        while k > 0 and sequence[i] != sequence[k]:
+            k = prefix[k - 1]
+            
+        if sequence[i] == sequence[k]:
+            k += 1
+            
+        prefix[i] = k
+        
+    return length - prefix[-1]
+
+
+
+""" STREAMING READER """
+
+"""
+Given a MIDI file path, go through it as (c, l) events, where:
+    c is the chord that is playing, as a 12 bit number where each bit stands for a pitch class (note modulo 12)
+    l is the length of that chord in 16th notes
+Works like read_file (same timing and tempo handling), but reads the bytes of the file directly (memory mapped)
+instead of creating a message object for every event. The notes that are playing are kept as a 128 bit number.
+"""
+def read_events(path):
+    
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+        
+        # File header: format, number of tracks & PPQ (number of ticks per quarter note)
+        if data[:4] != b'MThd':
+            raise ValueError("MThd not found. Probably not a MIDI file")
+        
+        size = int.from_bytes(data[4:8], 'big')
+        if size < 6 or len(data) < 14:
+            raise ValueError("The header of {:s} is cut off".format(path))
+        
+        form, tracks, PPQ = struct.unpack('>hhh', data[8:14])
+        if form == 2:
+            raise ValueError("Files with asynchronous tracks can't be played as one")
+        
+        # Find where each track starts and ends
+        position = 8 + size
+        chunks = list()
+        for _ in range(tracks):
+            
+            name, size = struct.unpack('>4sL', data[position:position + 8]) if len(data) >= position + 8 else (None, 0)
+            if name != b'MTrk' or len(data) < position + 8 + size:
+                raise ValueError("Track {:d} of {:s} is missing or cut off".format(len(chunks), path))
+            
+            chunks.append((position + 8, position + 8 + size))
+            position += 8 + size
+        
+        # Initialise variables
+        tempo = DEFAULT_TEMPO
+        to_16th = PPQ / 24
+        playing = 0
+        now = 0
+        end = 0
+        
+        # The events of all tracks, in order of time (the first track first when they are at the same time)
+        events = heapq.merge(*[read_track(data, start, stop) for start, stop in chunks], key = lambda event: event[0])
+        
+        for time, kind, value in events:
+            
+            # The end of a track only moves the end of the file
+            if kind == END:
+                end = max(end, time)
+                continue
+            
+            # Chord end (time in seconds, then in 16th notes)
+            if time > now:
+                seconds = (time - now) * (tempo * 1e-6 / PPQ)
+                length = round(seconds * to_16th)
+                if seconds > 0 and length > 0:
+                    yield pitch_classes(playing), length
+                now = time
+            
+            # Add note to 'currently playing'
+            if kind == NOTE_ON:
+                playing |= 1 << value
+                
+            # Remove note from 'currently playing'
+            elif kind == NOTE_OFF:
+                playing &= ~(1 << value)
+                
+            # Calculate the 'conversion value'
+            # (when multiplied with the time in seconds, gives length in 16th notes)
+            elif kind == TEMPO:
+                tempo = value
+                to_16th = ((500000 / tempo) * PPQ) / 24
+                
+        # The last chord lasts until the end of the last track
+        if end > now:
+            seconds = (end - now) * (tempo * 1e-6 / PPQ)
+            length = round(seconds * to_16th)
+            if seconds > 0 and length > 0:
+                yield pitch_classes(playing), length
+
+
+
+"""
+Go through the messages of a track (between 2 positions in the file), as (time in ticks, kind, value)
+where the value is the note of a note on / off and the tempo of a tempo change
+"""
+def read_track(data, position, stop):
+    
+    time = 0
+    status = None
+    
+    while position < stop:
+        
+        # Time since the last message
+        delta, position = read_number(data, position)
+        time += delta
+        begin = position
+        
+        # Status byte (a data byte means the status of the last message is used again)
+        running = data[position] < 0x80
+        if not running:
+            byte = data[position]
+            position += 1
+            
+            # Meta messages don't set running status
+            if byte != 0xFF:
+                status = byte
+        
+        elif status is None:
+            raise ValueError("Running status without a previous status")
+            
+        else:
+            byte = status
+        
+        # Meta message
+        if byte == 0xFF:
+            
+            meta = data[position]
+            length, position = read_number(data, position + 1)
+            if length > MAX_LENGTH:
+                raise ValueError("Message length {:d} exceeds maximum length".format(length))
+            
+            position += length
+            
+            # Tempo changes & track ends are decoded directly (a tempo change that is too short is rejected by mido below)
+            if meta == META_TEMPO and length >= 3:
+                yield time, TEMPO, int.from_bytes(data[position - length:position - length + 3], 'big')
+            
+            elif meta == META_END:
+                yield time, END, None
+            
+            # The others are rare, so they are built & checked by mido like in read_file
+            # (mido loses the time of meta messages it doesn't know)
+            else:
+                
+                message = mido.MetaMessage.from_bytes(list(data[begin:position]))
+                if isinstance(message, mido.UnknownMetaMessage):
+                    time -= delta
+                else:
+                    message.copy(time = 0)
+                
+                yield time, OTHER, None
+        
+        # System exclusive message (with running status, mido skips the data byte it used as status)
+        elif byte in [0xF0, 0xF7]:
+            
+            length, position = read_number(data, position + running)
+            if length > MAX_LENGTH:
+                raise ValueError("Message length {:d} exceeds maximum length".format(length))
+            
+            message = data[position:position + length]
+            position += length
+            
+            # (Without its start & end byte)
+            if message[:1] == b'\xf0':
+                message = message[1:]
+            if message[-1:] == b'\xf7':
+                message = message[:-1]
+            if max(message, default = 0) > 127:
+                raise ValueError("Data bytes must be in range 0..127")
+            
+            yield time, OTHER, None
+        
+        # Channel & system messages
+        else:
+            
+            size = CHANNEL_BYTES.get(byte >> 4) if byte < 0xF0 else SYSTEM_BYTES.get(byte)
+            if size is None:
+                raise ValueError("Undefined status byte 0x{:02x}".format(byte))
+            if running and size == 0:
+                raise ValueError("Running status of a message without data bytes")
+            
+            message = data[position:position + size]
+            position += size
+            if len(message) < size or max(message, default = 0) > 127:
+                raise ValueError("Data bytes must be in range 0..127")
+            
+            if byte >> 4 == 0x9:
+                yield time, NOTE_ON, message[0]
+            elif byte >> 4 == 0x8:
+                yield time, NOTE_OFF, message[0]
+            else:
+                yield time, OTHER, None
+                
+    if position != stop:
+        raise ValueError("The last message of a track is cut off")
+
+
+
+"""
+Read a variable length number, returns it and the position after it
+"""
+def read_number(data, position):
+    
+    number = 0
+    
+    while True:
+        byte = data[position]
+        position += 1
+        number = (number << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return number, position
+
+
+
+"""
+Fold the 128 bit number of notes that are playing into the 12 pitch classes
+"""
+def pitch_classes(playing):
+    
+    mask = 0
+    
+    while playing:
+        mask |= playing & 0xFFF
+        playing >>= 12
+        
+    return mask
+
+
+
 """
 Removes any loops and returns the shortest non-looping segment
+(the progression has to consist of whole repeats of it, i.e. 2, 3 or more times the same segment)
 """
 def reduce(progression):
     
     # Calculate progressions total length
     length = len(progression)
     
-    # Keep splitting the progression into equal parts
-    while progression[:int(length/2)] == progression[int(length/2):length]:
+    # Shortest segment that repeats, if the progression is made of whole repeats
+    shortest = period(progression)
+    if shortest > 0 and length % shortest == 0:
+        length = shortest
+        
+    return progression[:length]
+
+
+
+""" DEDUPLICATION """
+
+"""
+Return the normal form of a looping pattern: its smallest rotation (as a tuple).
+(Transposed progressions are different progressions, i.e. I-IV-V is not ii-V-vi, so they are not normalised)
+"""
+def canonical(pattern):
+    
+    pattern = list(pattern)
+    
+    return min(tuple(pattern[i:] + pattern[:i]) for i in range(max(len(pattern), 1)))
+
+
+
+"""
+Set of extracted patterns that counts how often each pattern (in normal form, see canonical) was found.
+A pattern is only new if no rotation of it was found before.
+"""
+class Pattern_Set:
+    
+    """
+    Constructor
+    """
+    def __init__(self):
+        
+        # Number of times each normal form was found (in the order they were first found)
+        self.counts = dict()
+        
+        
+    
+    """
+    Add a pattern, returns whether it is new
+    """
+    def add(self, pattern):
+        
+        key = canonical(pattern)
+        new = key not in self.counts
+        self.counts[key] = self.counts.get(key, 0) + 1
+        
+        return new
+    
+    
+    
+    """
+    Write how often each pattern was found to a file, a line per pattern
+    (in the same order as the patterns were written to their library)
+    """
+    def write_counts(self, path):
+        
+        with open(path, 'w') as file:
+            for count in self.counts.values():
+                file.write(str(count) + '\n')
+
+
+
+"""
+Return the path of the file with the pattern counts of a library
+(i.e. Patterns/Chords/rhythms.txt has its counts in Patterns/Chords/rhythms counts.txt)
+"""
+def counts_path(path):
+    
+    name, extension = os.path.splitext(path)
+    
+    return name + " counts" + extension
+    
+    
+    
+"""
+Return the path of the file with the n-gram model of a library (see Markov)
+(i.e. Patterns/Chords/rhythms.txt has its model in Patterns/Chords/rhythms model.npz)
+"""
+def model_path(path):
+    return os.path.splitext(path)[0] + " model.npz"
+    
+    
+    
+""" PIPELINE """
+
+"""
+Read a MIDI file (as chords of pitch classes, see read_events) and remove its loops
+"""
+def parse(path):
+    return reduce(list(read_events(path)))
+
+
+
+"""
+Parse a chunk of files, returns (path, progression) for each file
+(the progression is None if the file couldn't be read)
+"""
+def parse_chunk(paths):
+    
+    parsed = list()
+    
+    for path in paths:
+        
+        # A broken file shouldn't stop the whole corpus
+        try:
+            parsed.append((path, parse(path)))
+        except Exception:
+            parsed.append((path, None))
+            
+    return parsed
+
+
+
+"""
+Counts the files that are extracted and reports the progress and throughput every few seconds
+"""
+class Progress:
+    
+    """
+    Constructor
+    """
+    def __init__(self, report = REPORT):
         
-        # cut length in half
-        length = int(length/2)
+        self.report = report
+        self.files = 0
+        self.failed = 0
+        self.known = 0
+        self.start = time.perf_counter()
+        self.last = self.start
+        
+        
+    
+    """
+    Count a chunk of parsed files (and how many of them were known from the manifest)
+    """
+    def update(self, parsed, known = 0):
+        
+        self.files += len(parsed)
+        self.failed += sum(1 for _, progression in parsed if progression is None)
+        self.known += known
+        
+        if time.perf_counter() - self.last >= self.report:
+            self.show()
+            
+            
+    
+    """
+    Print the number of files so far and the number of files per second
+    """
+    def show(self):
+        
+        self.last = time.perf_counter()
+        elapsed = self.last - self.start
+        rate = self.files / elapsed if elapsed > 0 else 0
+        
+        print("{:d} files ({:d} known, {:d} failed), {:.0f} files/s".format(self.files, self.known, self.failed, rate))
+
+
+
+"""
+Parse MIDI files (from a list or generator of paths) and yield (path, progression) for each one that could be read,
+in the same order as the paths. The files are parsed in chunks by a pool of worker processes,
+which only run a few chunks ahead, so the paths and results never all have to be in memory.
+Files that are in the manifest (with the same contents) are not parsed again, unless the manifest is None.
+"""
+def extract(paths, workers = None, manifest = MANIFEST):
+    
+    workers = workers if workers is not None else os.cpu_count()
+    progress = Progress()
+    manifest = Manifest(manifest) if manifest is not None else None
+    paths = iter(paths)
+    chunks = iter(lambda: list(itertools.islice(paths, CHUNK)), [])
+    
+    # The extractors are scripts, spawned workers would run them again (so without fork the files are parsed here)
+    if workers == 0 or 'fork' not in multiprocessing.get_all_start_methods():
+        pool = None
+        results = ordered(pool, chunks, 1, manifest)
+        
+    else:
+        pool = ProcessPoolExecutor(workers, mp_context = multiprocessing.get_context('fork'))
+        results = ordered(pool, chunks, workers * AHEAD, manifest)
+    
+    try:
+        for parsed, known in results:
+            
+            progress.update(parsed, known)
+            
+            # (Files without any notes have nothing to extract)
+            for path, progression in parsed:
+                if progression:
+                    yield path, progression
+    
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures = True)
+        if manifest is not None:
+            manifest.save()
+        progress.show()
+        
+
+
+"""
+Parse chunks (in a pool, or here without one) and yield the results in order, with at most [ahead] chunks submitted at a time.
+Yields the parsed chunk and how many of its files were known from the manifest.
+"""
+def ordered(pool, chunks, ahead, manifest):
+    
+    pending = deque()
+    
+    for chunk in chunks:
+        
+        # Only the files that are not in the manifest are parsed
+        known, new = manifest.split(chunk) if manifest is not None else (dict(), chunk)
+        
+        if len(new) == 0:
+            parsed = list()
+        elif pool is None:
+            parsed = parse_chunk(new)
+        else:
+            parsed = pool.submit(parse_chunk, new)
+            
+        pending.append((chunk, known, parsed))
         
-    return progression[:length]
\ No newline at end of file
+        # Wait for the oldest chunk once enough are on their way
+        if len(pending) >= ahead:
+            yield merge(*pending.popleft(), manifest)
+            
+    while len(pending) > 0:
+        yield merge(*pending.popleft(), manifest)
+        
+
+
+"""
+Put the known and newly parsed files of a chunk back in order (the new ones are added to the manifest)
+"""
+def merge(chunk, known, parsed, manifest):
+    
+    if not isinstance(parsed, list):
+        parsed = parsed.result()
+        
+    if manifest is not None:
+        for path, progression in parsed:
+            manifest.store(path, progression)
+        
+    parsed = dict(parsed)
+    
+    return [(path, known.get(path) if path in known else parsed.get(path)) for path in chunk], len(known)
+
+
+
+""" MANIFEST """
+
+"""
+Return the hash of the contents of a file
+"""
+def file_hash(path):
+    
+    with open(path, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+
+"""
+Remembers what was extracted from each MIDI file, so a file is only parsed again when its contents change.
+Files are recognised by their contents (a hash), which is only calculated again when the size or modification time of a file changes.
+    files:      path: [size, time modified, hash]
+    results:    hash: progression (None if the file couldn't be read)
+"""
+class Manifest:
+    
+    """
+    Constructor (loads the manifest if there is one)
+    """
+    def __init__(self, path = MANIFEST):
+        
+        self.path = path
+        self.files = dict()
+        self.results = dict()
+        
+        try:
+            with open(path, 'r') as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return
+        
+        if manifest.get('version') == VERSION:
+            self.files = manifest.get('files')
+            self.results = manifest.get('results')
+            
+            
+            
+    """
+    Return the hash of a file (the file is only read if it changed)
+    """
+    def lookup(self, path):
+        
+        status = os.stat(path)
+        entry = self.files.get(path)
+        
+        if entry is None or entry[:2] != [status.st_size, status.st_mtime_ns]:
+            entry = [status.st_size, status.st_mtime_ns, file_hash(path)]
+            self.files[path] = entry
+            
+        return entry[2]
+    
+    
+    
+    """
+    Split a chunk of paths into the files that are known {path: progression} and the new ones [path]
+    """
+    def split(self, paths):
+        
+        known = dict()
+        new = list()
+        
+        for path in paths:
+            
+            # (A file that can't be read is left to the parser)
+            try:
+                digest = self.lookup(path)
+            except OSError:
+                new.append(path)
+                continue
+            
+            if digest in self.results:
+                known[path] = decode(self.results.get(digest))
+            else:
+                new.append(path)
+                
+        return known, new
+    
+    
+    
+    """
+    Remember the progression of a file
+    """
+    def store(self, path, progression):
+        
+        if path in self.files:
+            self.results[self.files.get(path)[2]] = encode(progression)
+            
+            
+            
+    """
+    Write the manifest (files that no longer exist and results that no file has are left out)
+    """
+    def save(self):
+        
+        self.files = {path: entry for path, entry in self.files.items() if os.path.isfile(path)}
+        hashes = set(entry[2] for entry in self.files.values())
+        self.results = {digest: result for digest, result in self.results.items() if digest in hashes}
+        
+        folder = os.path.dirname(self.path)
+        if folder != "":
+            os.makedirs(folder, exist_ok = True)
+        
+        # Written next to it first, so a run that is stopped never leaves half a manifest
+        with open(self.path + ".tmp", 'w') as file:
+            json.dump({'version': VERSION, 'files': self.files, 'results': self.results}, file)
+        os.replace(self.path + ".tmp", self.path)
+
+
+
+"""
+Turn a progression into something that can be written as JSON
+"""
+def encode(progression):
+    
+    if progression is None:
+        return None
+    
+    return [[chord, length] for chord, length in progression]
+
+
+
+"""
+Turn a progression from the manifest back into (chord, length) events
+"""
+def decode(progression):
+    
+    if progression is None:
+        return None
+    
+    return [(chord, length) for chord, length in progression]
\ No newline at end of file
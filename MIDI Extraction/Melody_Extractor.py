@@ -7,8 +7,9 @@ Created on Mon Jun  3 12:06:38 2024
 
 """ IMPORTS """
 
-from MIDI_Extractor import collect_paths, read_file, reduce
+from MIDI_Extractor import walk_paths, extract, reduce, Pattern_Set, counts_path, model_path
 from Scale import Scale
+from Markov import Ngram_Counter
 from Combiner import divide_rhythm
 
 
@@ -22,8 +23,8 @@ directories = [
     "MIDI/TERROR/MELO/MELO/MIN"
     ]
 
-# Collect paths to files
-paths = collect_paths(directories)
+# Go through the paths to the files (they are read as they are needed)
+paths = walk_paths(directories)
 
 
 
@@ -84,53 +85,50 @@ def split(rhythm):
     
     
     
-""" COLLECTING MINOR PROGRESSIONS """
-
-progressions = []
-
-for path in paths:
-    
-    # Convert to progression
-    progression = read_file(path)
-    
-    # Remove loops
-    progression = reduce(progression)
-    
-    progressions.append(progression)
-    
-    
-
 """ EXTRACT RHYTHMS """
 
-# Extract rhythms from the chord progressions
-rhythms = [[length for (chord, length) in progression] for progression in progressions]
+# Output file
+rhythms_path = 'Patterns/Melody/rhythms (extraction).txt'
 
-# Reduce rhythms
-rhythms = [reduce(rhythm) for rhythm in rhythms]
+# Rhythms that have been written already (rotations of a loop are the same)
+rhythms_selection = Pattern_Set()
 
-rhythms_selection = list()
+# Transitions between the values of every rhythm that is found (see Markov)
+rhythms_model = Ngram_Counter()
 
-# Remove rhythms that don't add up to a multiple of 16 and remove duplicates
-for rhythm in rhythms:
-    if suitable(rhythm):
+# The files are parsed in parallel (see extract), each result is written to the file as soon as it comes in
+with open(rhythms_path, 'w') as file:
+    
+    for path, progression in extract(paths):
         
-        # Split into chunks that sum to 16
-        chunks = split(rhythm)
+        # Extract the rhythm from the melody and reduce it
+        rhythm = reduce([length for (chord, length) in progression])
         
-        for rhythm in chunks:
+        # Remove rhythms that don't add up to a multiple of 16 and remove duplicates
+        if suitable(rhythm):
             
-            if rhythm not in rhythms_selection:
-                rhythms_selection.append(rhythm)
-        
+            # Split into chunks that sum to 16
+            chunks = split(rhythm)
+            
+            for rhythm in chunks:
+                
+                rhythms_model.add(rhythm)
+                
+                if rhythms_selection.add(rhythm):
+                    
+                    # Join the elements of the rhythm into a string and write it to the file
+                    file.write(' '.join(map(str, rhythm)) + '\n')
 
 
 
-""" WRITE RESULTS TO FILE """
+""" WRITE PATTERN COUNTS """
 
-# Write rhythms to file
-with open('Patterns/Melody/rhythms (extraction).txt', 'w') as file:
-    
-    for progression in rhythms_selection:
-        
-        # Join the elements of the progression list into a string and write it to the file
-        file.write(' '.join(map(str, progression)) + '\n')  
\ No newline at end of file
+# How often each rhythm was found, alongside the library
+rhythms_selection.write_counts(counts_path(rhythms_path))
+
+
+
+""" WRITE N-GRAM MODEL """
+
+# Transition table the players draw new rhythms from, alongside the library
+rhythms_model.save(model_path(rhythms_path))
\ No newline at end of file